@@ -0,0 +1,37 @@
+"""unit price and product name snapshot on order_products
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('order_products', sa.Column('unit_price', sa.Float(), nullable=True))
+    op.add_column('order_products', sa.Column('product_name', sa.String(), nullable=True))
+    # Existing lines get the current product values, the closest we have to the price paid
+    op.execute(
+        "UPDATE order_products SET "
+        "unit_price = (SELECT price FROM products WHERE products.id = order_products.product_id), "
+        "product_name = (SELECT name FROM products WHERE products.id = order_products.product_id)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('order_products') as batch_op:
+        batch_op.drop_column('product_name')
+        batch_op.drop_column('unit_price')
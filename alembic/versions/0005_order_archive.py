@@ -0,0 +1,52 @@
+"""orders.created_at and orders_archive
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Added nullable and backfilled first, existing orders count as placed at migration time.
+    # The batch recreates the table on SQLite, which can't alter a column in place.
+    op.add_column('orders', sa.Column('created_at', sa.DateTime(), nullable=True))
+    # created_at holds naive UTC, CURRENT_TIMESTAMP is already UTC on SQLite but session local on Postgres
+    now = "CURRENT_TIMESTAMP" if op.get_context().dialect.name == "sqlite" else "timezone('UTC', now())"
+    op.execute(f"UPDATE orders SET created_at = {now}")
+    with op.batch_alter_table('orders') as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_index(batch_op.f('ix_orders_created_at'), ['created_at'], unique=False)
+
+    # Monthly partitions are created by the archival job as it needs them
+    op.create_table(
+        'orders_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('total_price', sa.Float(), nullable=True),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.Column('lines', sa.JSON(), nullable=False),
+        sa.PrimaryKeyConstraint('id', 'created_at'),
+        postgresql_partition_by='RANGE (created_at)',
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('orders_archive')
+    with op.batch_alter_table('orders') as batch_op:
+        batch_op.drop_index(batch_op.f('ix_orders_created_at'))
+        batch_op.drop_column('created_at')
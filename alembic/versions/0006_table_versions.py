@@ -0,0 +1,39 @@
+"""table_versions change counters
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 00:00:00
+
+"""
+import time
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    table_versions = op.create_table(
+        'table_versions',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('modified_at', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+    )
+    # Seeded so bumps only ever update, the first writers don't race to insert the rows
+    op.bulk_insert(table_versions, [
+        {'name': name, 'version': 0, 'modified_at': time.time()} for name in ('orders', 'products')
+    ])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('table_versions')
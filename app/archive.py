@@ -0,0 +1,120 @@
+"""
+Moves closed orders older than ARCHIVE_AFTER_DAYS from orders/order_products
+into orders_archive, keeping the hot tables and their indexes small.
+
+    python -m app.archive [older_than_days]
+"""
+import logging
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session, selectinload
+
+from app.cache import order_cache, table_versions
+from app.models import Order, OrderArchive, OrderProduct, utcnow
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+CLOSED_ORDER_STATUSES = ("completed",)
+
+
+def month_start(value: datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+def next_month(value: date) -> date:
+    return date(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def partition_ddl(month: date) -> str:
+    name = f"{OrderArchive.__tablename__}_{month:%Y_%m}"
+    return (
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {OrderArchive.__tablename__} "
+        f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month(month):%Y-%m-%d}')"
+    )
+
+
+def ensure_archive_partitions(db: Session, months: set) -> None:
+    """Create the monthly partitions rows are about to land in, Postgres only"""
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    for month in sorted(months):
+        db.execute(text(partition_ddl(month)))
+
+
+def archive_orders(db: Session, older_than_days: int = ARCHIVE_AFTER_DAYS,
+                   batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Archive closed orders created before the cutoff, one transaction per batch"""
+    cutoff = utcnow() - timedelta(days=older_than_days)
+    archived = 0
+
+    while True:
+        orders = db.query(Order).options(selectinload(Order.order_products)).filter(
+            Order.status.in_(CLOSED_ORDER_STATUSES), Order.created_at < cutoff
+        ).order_by(Order.created_at).limit(batch_size).with_for_update(skip_locked=True).all()
+        if not orders:
+            break
+
+        ensure_archive_partitions(db, {month_start(order.created_at) for order in orders})
+        db.add_all([archived_order(order) for order in orders])
+
+        order_ids = [order.id for order in orders]
+        db.query(OrderProduct).filter(OrderProduct.order_id.in_(order_ids)).delete(synchronize_session=False)
+        db.query(Order).filter(Order.id.in_(order_ids)).delete(synchronize_session=False)
+        table_versions.bump("orders", db=db)
+        db.commit()
+        db.expunge_all()
+
+        archived += len(orders)
+        if len(orders) < batch_size:
+            break
+
+    if archived:
+        order_cache.invalidate("orders_list")
+        logger.info(f"Archived {archived} orders created before {cutoff:%Y-%m-%d}")
+    return archived
+
+
+def archived_order(order: Order) -> OrderArchive:
+    return OrderArchive(
+        id=order.id,
+        created_at=order.created_at,
+        total_price=order.total_price,
+        status=order.status,
+        lines=[
+            {
+                "product_id": op.product_id,
+                "quantity": op.quantity,
+                "unit_price": op.unit_price,
+                "product_name": op.product_name,
+            }
+            for op in order.order_products
+        ]
+    )
+
+
+def get_archived_order(db: Session, order_id: int):
+    return db.query(OrderArchive).filter(OrderArchive.id == order_id).first()
+
+
+def main(argv: list[str]) -> None:
+    from app.settings.production import SessionLocal
+
+    if len(argv) > 1 or (argv and not argv[0].isdigit()):
+        sys.exit(__doc__)
+
+    db = SessionLocal()
+    db.use_primary = True
+    try:
+        days = int(argv[0]) if argv else ARCHIVE_AFTER_DAYS
+        print(f"Archived {archive_orders(db, older_than_days=days)} orders")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
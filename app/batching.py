@@ -0,0 +1,83 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# Opt-in group commit for create_order, see app.views.orders.create_orders_batch
+ORDER_BATCHING_ENABLED = os.getenv("ORDER_BATCHING_ENABLED", "false").lower() == "true"
+ORDER_BATCH_WINDOW_MS = float(os.getenv("ORDER_BATCH_WINDOW_MS", "2"))
+ORDER_BATCH_MAX_SIZE = int(os.getenv("ORDER_BATCH_MAX_SIZE", "64"))
+# How long a checkout waits for its batch before giving up, so a stuck batch doesn't hang every caller
+ORDER_BATCH_TIMEOUT_SECONDS = float(os.getenv("ORDER_BATCH_TIMEOUT_SECONDS", "30"))
+
+
+class GroupCommitter:
+    """
+    Collects work items submitted from many threads into small batches and runs
+    them through one handler call, so a batch shares a single transaction and commit.
+    A batch closes after `window` seconds or once it holds `max_size` items.
+
+    The handler receives the list of items and returns one result per item, in
+    order. A result that is an exception is raised in that item's caller only.
+    """
+
+    def __init__(self, handler, window=0.002, max_size=64, timeout=30.0):
+        self.handler = handler
+        self.window = window
+        self.max_size = max_size
+        self.timeout = timeout
+        self.queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, item):
+        """Queue item and block until its batch has been committed, TimeoutError after timeout seconds"""
+        future = Future()
+        self.queue.put((item, future))
+        self._ensure_started()
+        return future.result(timeout=self.timeout)
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self.run_batch(self.next_batch())
+
+    def next_batch(self) -> list:
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def run_batch(self, batch) -> None:
+        try:
+            results = self.handler([item for item, _ in batch])
+        except Exception as exc:
+            # The shared transaction failed, every caller in the batch gets the error
+            logger.exception(f"Group commit of {len(batch)} items failed")
+            for _, future in batch:
+                future.set_exception(exc)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -1,23 +1,156 @@
+import logging
+import os
+import threading
 import time
+from typing import Optional
+
+from sqlalchemy import event, insert, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.models import TableVersion
+from app.tracing import tracer, current_span
+
+logger = logging.getLogger(__name__)
+
+# Entries kept by the bounded caches, new keys must then be hotter than the oldest entry to get in
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+# How long a process trusts the table versions it read, bounds how stale an ETag from another process's write gets
+TABLE_VERSION_CHECK_SECONDS = float(os.getenv("TABLE_VERSION_CHECK_SECONDS", "1"))
+
+
+class FrequencySketch:
+    """
+    Count-min sketch of key access counts with TinyLFU aging: 4 bit counters
+    that are all halved every sample_size accesses, so old popularity fades.
+    Also tracks the current heavy hitters for hot_keys().
+    """
+
+    MAX_COUNT = 15
+    # Odd 64 bit multipliers, one per row, so keys colliding in one row rarely collide in the others
+    SEEDS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93)
+    # Byte -> byte // 2, aging halves a whole table in one translate call instead of a Python loop
+    HALVE = bytes(count >> 1 for count in range(256))
+
+    def __init__(self, capacity, depth=4, top_k=1000):
+        # A few counters per cached entry keep collisions with the keys of one-off scans rare
+        width = 1
+        while width < 4 * capacity:
+            width *= 2
+        self.shift = 64 - (width.bit_length() - 1)
+        self.seeds = self.SEEDS[:depth]
+        self.tables = [bytearray(width) for _ in range(depth)]
+        self.sample_size = 10 * capacity
+        self.additions = 0
+        self.top_k = top_k
+        self.hot = {}
+        self.hot_floor = 0
+        # Caches are read from threadpool threads, aging must not run while another thread tracks a key
+        self.lock = threading.Lock()
+
+    def indexes(self, key):
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        return [((h * seed) & 0xFFFFFFFFFFFFFFFF) >> self.shift for seed in self.seeds]
+
+    def estimate(self, key) -> int:
+        return min(table[i] for table, i in zip(self.tables, self.indexes(key)))
+
+    def increment(self, key) -> None:
+        indexes = self.indexes(key)
+        with self.lock:
+            count = min(table[i] for table, i in zip(self.tables, indexes))
+            if count < self.MAX_COUNT:
+                # Conservative update: only the counters at the minimum grow, which limits overestimates
+                for table, i in zip(self.tables, indexes):
+                    if table[i] == count:
+                        table[i] = count + 1
+                count += 1
+            self.track(key, count)
+
+            self.additions += 1
+            if self.additions >= self.sample_size:
+                self.age()
+
+    def track(self, key, count) -> None:
+        if key not in self.hot and len(self.hot) >= self.top_k and count <= self.hot_floor:
+            return
+        self.hot[key] = count
+        if len(self.hot) > 2 * self.top_k:
+            kept = sorted(self.hot.items(), key=lambda item: item[1], reverse=True)[:self.top_k]
+            self.hot = dict(kept)
+            self.hot_floor = kept[-1][1]
+
+    def age(self) -> None:
+        """Halve every count, called by increment with the lock held"""
+        self.additions //= 2
+        for table in self.tables:
+            table[:] = table.translate(self.HALVE)
+        self.hot = {key: count >> 1 for key, count in self.hot.items() if count > 1}
+        self.hot_floor >>= 1
+
+    def hot_keys(self, limit=None) -> list:
+        with self.lock:
+            hot = self.hot.copy()
+        keys = sorted(hot, key=hot.get, reverse=True)
+        return keys[:limit] if limit is not None else keys
 
 
 class Cache:
-    def __init__(self, ttl_seconds=300):
+    def __init__(self, ttl_seconds=300, max_size=None):
         self.cache = {}
         self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        # Access frequencies drive admission and the hot keys prefetched on startup
+        self.sketch = FrequencySketch(max_size) if max_size else None
 
     def get(self, key):
+        if self.sketch is not None:
+            self.sketch.increment(key)
+        if current_span.get() is None:
+            return self._get(key)
+        with tracer.span("cache.get", **{"cache.key": key}) as span:
+            value = self._get(key)
+            span.set("cache.hit", value is not None)
+            return value
+
+    def _get(self, key):
         if key in self.cache:
             value, expiry = self.cache[key]
             if expiry > time.time():
                 return value
             else:
-                del self.cache[key]
+                self.cache.pop(key, None)
         return None
 
     def set(self, key, value):
+        if self.max_size and key not in self.cache and len(self.cache) >= self.max_size:
+            if not self.make_room_for(key):
+                return
         self.cache[key] = (value, time.time() + self.ttl_seconds)
 
+    def make_room_for(self, key) -> bool:
+        """
+        TinyLFU admission: evict the oldest entry only if key was accessed more
+        often, so a one-off scan over many keys can't flush the hot ones.
+        """
+        try:
+            victim = next(iter(self.cache))
+            _, expiry = self.cache[victim]
+        except (StopIteration, RuntimeError, KeyError):
+            return True
+        if expiry > time.time() and self.sketch.estimate(key) <= self.sketch.estimate(victim):
+            return False
+        self.cache.pop(victim, None)
+        return True
+
+    def hot_keys(self, limit=None) -> list:
+        """Most frequently accessed keys, hottest first"""
+        return self.sketch.hot_keys(limit) if self.sketch is not None else []
+
+    def delete(self, *keys):
+        for key in keys:
+            self.cache.pop(key, None)
+
     def invalidate(self, key_prefix=None):
         if key_prefix:
             keys_to_delete = [k for k in self.cache.keys() if k.startswith(key_prefix)]
@@ -27,4 +160,118 @@ class Cache:
             self.cache.clear()
 
 
-order_cache = Cache(ttl_seconds=300)
+order_cache = Cache(ttl_seconds=300, max_size=CACHE_MAX_ENTRIES)
+# Summed stock of striped products, short lived since every order changes it
+stock_cache = Cache(ttl_seconds=1)
+# Non-striped products by id, dropped by every write that changes their stock
+product_cache = Cache(ttl_seconds=60, max_size=CACHE_MAX_ENTRIES)
+
+
+class TableVersions:
+    """
+    Per-table change counters behind the list ETags. The table_versions rows are
+    bumped in a short transaction of their own once a write commits, so checkouts
+    never queue on them, and every process sees the bump. Reads cache those rows
+    for TABLE_VERSION_CHECK_SECONDS. The in-process counters move on commit too,
+    for the caches that must drop entries immediately, and also count per entity
+    tags such as product_{id} that are never stored.
+    """
+
+    def __init__(self, check_seconds=TABLE_VERSION_CHECK_SECONDS):
+        self.versions = {}
+        self.modified = {}
+        self.check_seconds = check_seconds
+        # table -> (version, modified_at, fetched at)
+        self.stored = {}
+
+    def bump(self, *tables, db=None):
+        """Bump tables, with db the bump waits for db to commit and is dropped if it rolls back"""
+        if db is None:
+            return self.bump_local(*tables)
+        # The primary, where the write goes
+        db.info["version_bind"] = db.get_bind(clause=update(TableVersion))
+        db.info.setdefault("bumped_tables", set()).update(tables)
+
+    def bump_local(self, *tables):
+        now = time.time()
+        for table in tables:
+            self.versions[table] = self.versions.get(table, 0) + 1
+            self.modified[table] = now
+            self.stored.pop(table, None)
+
+    def store(self, bind, tables) -> None:
+        """Bump the table_versions rows, in a fixed order so concurrent bumps can't deadlock"""
+        now = time.time()
+        try:
+            self._store(bind, sorted(tables), now)
+        except IntegrityError:
+            # Another process inserted a missing row first, it exists now
+            self._store(bind, sorted(tables), now)
+
+    def _store(self, bind, tables, now) -> None:
+        with bind.begin() as conn:
+            for table in tables:
+                result = conn.execute(
+                    update(TableVersion).where(TableVersion.name == table)
+                    .values(version=TableVersion.version + 1, modified_at=now)
+                )
+                if not result.rowcount:
+                    conn.execute(insert(TableVersion).values(name=table, version=1, modified_at=now))
+
+    def load(self, db, tables) -> dict:
+        """Stored (version, modified_at) of tables, read at most every check_seconds"""
+        now = time.time()
+        stale = [t for t in tables if t not in self.stored or now - self.stored[t][2] >= self.check_seconds]
+        if stale:
+            rows = {row.name: row for row in db.query(TableVersion).filter(TableVersion.name.in_(stale))}
+            for table in stale:
+                row = rows.get(table)
+                self.stored[table] = (row.version, row.modified_at, now) if row else (0, 0.0, now)
+        return {table: self.stored[table] for table in tables}
+
+    def etag(self, db, *tables) -> str:
+        stored = self.load(db, tables)
+        # The bump time keeps tags apart if the counters ever restart, e.g. on a recreated database
+        return '"' + "-".join(f"{t}{stored[t][0]}.{int(stored[t][1] * 1000):x}" for t in tables) + '"'
+
+    def last_modified(self, db, *tables) -> Optional[float]:
+        """Time of the last stored bump of tables, None if they were never bumped"""
+        stored = self.load(db, tables)
+        return max(stored[t][1] for t in tables) or None
+
+
+table_versions = TableVersions()
+
+
+def invalidate_products(product_ids):
+    """Drop cached products after a committed write, here and in the response cache"""
+    keys = [f"product_{product_id}" for product_id in product_ids]
+    product_cache.delete(*keys)
+    table_versions.bump_local(*keys)
+
+
+@event.listens_for(Session, "after_commit")
+def apply_committed_bumps(session):
+    tables = session.info.pop("bumped_tables", None)
+    if tables:
+        table_versions.bump_local(*tables)
+        session.info["committed_bumps"] = (session.info.pop("version_bind"), tables)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_rolled_back_bumps(session):
+    session.info.pop("bumped_tables", None)
+    session.info.pop("version_bind", None)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def store_committed_bumps(session, transaction):
+    # Only once the session gave its connection back, holding it while taking another can drain the pool
+    if transaction.parent is not None or "committed_bumps" not in session.info:
+        return
+    bind, tables = session.info.pop("committed_bumps")
+    try:
+        table_versions.store(bind, tables)
+    except SQLAlchemyError:
+        # The write itself committed, other processes notice it once the next bump lands
+        logger.exception("Storing table versions failed")
@@ -0,0 +1,120 @@
+import gzip
+import importlib.util
+import os
+
+# brotli is optional, gzip only without it. It is imported on the first brotli response, not at startup
+BROTLI_AVAILABLE = importlib.util.find_spec("brotli") is not None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+# Bodies smaller than this are sent as is, compressing them costs more than it saves
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE_TYPES = (b"application/json", b"text/")
+
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """Codings listed in Accept-Encoding, minus those refused with a zero (or malformed) q value"""
+    accepted = set()
+    for token in accept_encoding.lower().split(","):
+        coding, *params = [part.strip() for part in token.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding)
+    return accepted
+
+
+def choose_encoding(accept_encoding: str, brotli_available: bool = BROTLI_AVAILABLE):
+    accepted = accepted_encodings(accept_encoding)
+    if brotli_available and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def weak_etag(etag: bytes) -> bytes:
+    return etag if etag.startswith(b"W/") else b"W/" + etag
+
+
+class CompressionMiddleware:
+    """
+    Compresses JSON and text responses with brotli when the client accepts it
+    and the package is installed, gzip otherwise. The body is buffered, which
+    is fine for this API since every response is a single JSON document.
+    """
+
+    def __init__(self, app, minimum_size=COMPRESSION_MINIMUM_SIZE, gzip_level=GZIP_LEVEL,
+                 brotli_quality=BROTLI_QUALITY):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept_encoding)
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start_message = None
+        chunks = []
+
+        async def send_compressed(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                return await send(message)
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            await send_start_and_body(start_message, b"".join(chunks))
+
+        async def send_start_and_body(start, body):
+            headers = [(k, v) for k, v in start["headers"] if k != b"content-length"]
+            if self.should_compress(start, body):
+                body = self.compress(body, encoding)
+                # The bytes differ per encoding, so the tag only promises an equivalent representation
+                headers = [(k, weak_etag(v) if k == b"etag" else v) for k, v in headers]
+                headers.append((b"content-encoding", encoding.encode()))
+                headers.append((b"vary", b"Accept-Encoding"))
+            headers.append((b"content-length", str(len(body)).encode()))
+            await send({**start, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
+
+    def should_compress(self, start, body) -> bool:
+        if len(body) < self.minimum_size or start["status"] < 200 or start["status"] in (204, 304):
+            return False
+        content_type = b""
+        for name, value in start["headers"]:
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type":
+                content_type = value
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            import brotli
+
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
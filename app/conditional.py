@@ -0,0 +1,39 @@
+from email.utils import formatdate
+from typing import Optional
+
+from fastapi import Request, Response, status
+from sqlalchemy.orm import Session
+
+from app.cache import table_versions
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison, as If-None-Match uses: compressed responses carry a weak tag"""
+    if if_none_match.strip() == "*":
+        return True
+    etag = etag.removeprefix("W/")
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def conditional_get(request: Request, response: Response, db: Session, *tables: str,
+                    variant: str = None) -> Optional[Response]:
+    """
+    Set ETag and Last-Modified from the table versions on response, and return
+    a 304 response when the client's copy is current so the view can skip the DB.
+    variant tells apart representations of the same tables, e.g. expanded orders.
+    """
+    etag = table_versions.etag(db, *tables)
+    if variant:
+        etag = f'{etag[:-1]}-{variant}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    last_modified = table_versions.last_modified(db, *tables)
+    if last_modified:
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response.headers.update(headers)
+    return None
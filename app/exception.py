@@ -28,3 +28,12 @@ class OrderNotFoundError(HTTPException):
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Order with id {order_id} not found"
         )
+
+
+class ReservationNotFoundError(HTTPException):
+    def __init__(self, reservation_id: int):
+        self.reservation_id = reservation_id
+        super().__init__(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Reservation with id {reservation_id} not found or expired"
+        )
@@ -0,0 +1,190 @@
+"""
+Striped stock for hot products.
+
+A striped product keeps its stock in `stock_buckets` rows of product_stock_buckets
+instead of products.stock, so concurrent orders lock different rows. Manage it with
+
+    python -m app.inventory stripe <product_id> <buckets>
+    python -m app.inventory unstripe <product_id>
+    python -m app.inventory rebalance [<product_id>]
+"""
+import random
+import sys
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from app import exception
+from app.cache import stock_cache, invalidate_products
+from app.models import Product, ProductStockBucket
+
+
+def take_striped_stock(db: Session, product: Product, quantity: int) -> list[tuple[int, int]]:
+    """
+    Decrement quantity from the product's buckets, starting at a random one.
+    Returns the (bucket, amount) pairs taken so a caller can give them back.
+    """
+    buckets = product.stock_buckets
+    start = random.randrange(buckets)
+    for offset in range(buckets):
+        bucket = (start + offset) % buckets
+        result = db.execute(
+            update(ProductStockBucket)
+            .where(ProductStockBucket.product_id == product.id,
+                   ProductStockBucket.bucket == bucket,
+                   ProductStockBucket.stock >= quantity)
+            .values(stock=ProductStockBucket.stock - quantity)
+        )
+        if result.rowcount:
+            return [(bucket, quantity)]
+
+    # Slow path, no single bucket holds enough: lock them all and drain across buckets
+    rows = db.query(ProductStockBucket).filter(
+        ProductStockBucket.product_id == product.id
+    ).order_by(ProductStockBucket.bucket).with_for_update().all()
+
+    available = sum(row.stock for row in rows)
+    if available < quantity:
+        raise exception.InsufficientStockError(product_id=product.id, available=available, requested=quantity)
+
+    taken = []
+    remaining = quantity
+    for row in rows:
+        amount = min(row.stock, remaining)
+        if amount:
+            row.stock -= amount
+            remaining -= amount
+            taken.append((row.bucket, amount))
+        if not remaining:
+            break
+    db.flush()
+    return taken
+
+
+def restore_striped_stock(db: Session, product_id: int, taken: list[tuple[int, int]]) -> None:
+    """Give back stock returned by take_striped_stock"""
+    for bucket, amount in taken:
+        db.execute(
+            update(ProductStockBucket)
+            .where(ProductStockBucket.product_id == product_id, ProductStockBucket.bucket == bucket)
+            .values(stock=ProductStockBucket.stock + amount)
+        )
+
+
+def striped_stock_totals(db: Session, product_ids: list[int]) -> dict:
+    """Summed stock of striped products, from the aggregate cache or one grouped query for the misses"""
+    totals = {}
+    misses = []
+    for product_id in product_ids:
+        cached = stock_cache.get(f"stock_{product_id}")
+        if cached is None:
+            misses.append(product_id)
+        else:
+            totals[product_id] = cached
+
+    if misses:
+        rows = db.query(ProductStockBucket.product_id, func.sum(ProductStockBucket.stock)).filter(
+            ProductStockBucket.product_id.in_(misses)
+        ).group_by(ProductStockBucket.product_id).all()
+        for product_id, total in rows:
+            totals[product_id] = int(total)
+            stock_cache.set(f"stock_{product_id}", int(total))
+
+    return totals
+
+
+def split_evenly(total: int, buckets: int) -> list[int]:
+    return [total // buckets + (1 if i < total % buckets else 0) for i in range(buckets)]
+
+
+def enable_striping(db: Session, product_id: int, buckets: int) -> None:
+    """Move a product's stock into `buckets` bucket rows"""
+    if buckets < 1:
+        raise ValueError("A striped product needs at least one bucket")
+    product = db.query(Product).filter(Product.id == product_id).with_for_update().first()
+    if product is None:
+        raise exception.ProductNotFoundError(product_id)
+
+    total = product.stock or 0
+    if product.stock_buckets:
+        total = collapse_buckets(db, product)
+
+    db.add_all([
+        ProductStockBucket(product_id=product.id, bucket=i, stock=stock)
+        for i, stock in enumerate(split_evenly(total, buckets))
+    ])
+    product.stock = 0
+    product.stock_buckets = buckets
+    db.commit()
+    stock_cache.delete(f"stock_{product_id}")
+    invalidate_products([product_id])
+
+
+def disable_striping(db: Session, product_id: int) -> None:
+    """Move a striped product's stock back into products.stock"""
+    product = db.query(Product).filter(Product.id == product_id).with_for_update().first()
+    if product is None:
+        raise exception.ProductNotFoundError(product_id)
+    if product.stock_buckets:
+        product.stock = collapse_buckets(db, product)
+        product.stock_buckets = 0
+        db.commit()
+    stock_cache.delete(f"stock_{product_id}")
+    invalidate_products([product_id])
+
+
+def collapse_buckets(db: Session, product: Product) -> int:
+    rows = db.query(ProductStockBucket).filter(
+        ProductStockBucket.product_id == product.id
+    ).with_for_update().all()
+    total = sum(row.stock for row in rows)
+    for row in rows:
+        db.delete(row)
+    db.flush()
+    return total
+
+
+def rebalance_stock(db: Session, product_id: int) -> list[int]:
+    """Spread a striped product's stock evenly again so orders keep hitting the fast path"""
+    rows = db.query(ProductStockBucket).filter(
+        ProductStockBucket.product_id == product_id
+    ).order_by(ProductStockBucket.bucket).with_for_update().all()
+    if not rows:
+        return []
+
+    for row, stock in zip(rows, split_evenly(sum(row.stock for row in rows), len(rows))):
+        row.stock = stock
+    db.commit()
+    return [row.stock for row in rows]
+
+
+def rebalance_all(db: Session) -> int:
+    """Rebalance every striped product, returns how many were rebalanced"""
+    product_ids = [p.id for p in db.query(Product.id).filter(Product.stock_buckets > 0).all()]
+    for product_id in product_ids:
+        rebalance_stock(db, product_id)
+    return len(product_ids)
+
+
+def main(argv: list[str]) -> None:
+    from app.settings.production import SessionLocal
+
+    db = SessionLocal()
+    db.use_primary = True
+    try:
+        if argv[:1] == ["stripe"] and len(argv) == 3:
+            enable_striping(db, int(argv[1]), int(argv[2]))
+        elif argv[:1] == ["unstripe"] and len(argv) == 2:
+            disable_striping(db, int(argv[1]))
+        elif argv[:1] == ["rebalance"] and len(argv) == 2:
+            print(rebalance_stock(db, int(argv[1])))
+        elif argv == ["rebalance"]:
+            print(f"Rebalanced {rebalance_all(db)} products")
+        else:
+            sys.exit(__doc__)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
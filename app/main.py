@@ -1,30 +1,61 @@
+import asyncio
 import logging
-from fastapi import FastAPI, status
+from fastapi import FastAPI, Request, status
 from contextlib import asynccontextmanager
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-import uvicorn
 
 from app.urls import router  # Import the centralized router
 
-from app.settings.production import engine, Base
+from app import startup
+from app.reservations import run_sweeper
+from app.settings.production import SessionLocal, engine, replicas
+from app.ratelimit import RateLimitMiddleware
+from app.compression import CompressionMiddleware, COMPRESSION_ENABLED
+from app.response_cache import ResponseCacheMiddleware, RESPONSE_CACHE_ENABLED
+from app.observability import configure_logging, RequestContextMiddleware
+from app.tracing import instrument_engine
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
+# Configure logging, JSON lines written by a listener thread so requests never block on I/O
+configure_logging(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Sampled db.query spans, a no-op unless tracing is enabled. Reads of GET requests run on the replicas
+for traced_engine in [engine, *(replicas.engines if replicas else [])]:
+    instrument_engine(traced_engine)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Handles startup and shutdown events."""
-    # Create tables on startup
-    Base.metadata.create_all(bind=engine)
+    # Create tables on startup unless migrations already manage the schema
+    startup.prepare_schema()
+
+    # Warm up in the background so /health answers immediately, /ready flips once done
+    app.state.ready = False
+    warm_up_task = asyncio.create_task(startup.warm_up(app))
+
+    # Release expired cart reservations in the background
+    sweeper_task = asyncio.create_task(run_sweeper(SessionLocal))
+
+    # Remember the hottest cache keys so the next start can prefetch them
+    snapshot_task = None
+    if startup.HOT_KEYS_ENABLED:
+        from app.warming import run_snapshotter, snapshot_hot_keys
+
+        snapshot_task = asyncio.create_task(run_snapshotter())
 
     yield  # Yield control back to FastAPI
 
+    warm_up_task.cancel()
+    sweeper_task.cancel()
+    if snapshot_task:
+        snapshot_task.cancel()
+        try:
+            snapshot_hot_keys()
+        except OSError:
+            logger.exception("Hot key snapshot failed")
+
 app = FastAPI(
     title="E-Commerce API",
     description="A RESTful API for a simple e-commerce platform",
@@ -32,6 +63,20 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# gzip/brotli for large JSON bodies, innermost so it only sees the app's responses
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# Encoded GET responses replayed without routing, outside compression so hits skip it too
+if RESPONSE_CACHE_ENABLED:
+    app.add_middleware(ResponseCacheMiddleware)
+
+# Rate limiting and load shedding, inside CORS so 429/503 responses stay readable by browsers
+app.add_middleware(RateLimitMiddleware)
+
+# Request ids and the root trace span, outside the limiter so shed requests are logged with an id too
+app.add_middleware(RequestContextMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -47,7 +92,7 @@ app.include_router(router)
 
 # Global exception handler
 @app.exception_handler(Exception)
-async def global_exception_handler(exc: Exception):
+async def global_exception_handler(request: Request, exc: Exception):
     logger.exception(f"Unhandled exception: {exc}")
     return JSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -63,5 +108,21 @@ def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/ready")
+def readiness_check():
+    """
+    Readiness endpoint, returns 503 until the connection pool and caches are warm.
+    """
+    if not getattr(app.state, "ready", False):
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "warming"}
+        )
+    return {"status": "ready"}
+
+
 if __name__ == "__main__":
+    # Only needed when run directly, keep it off the import path of the served app
+    import uvicorn
+
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
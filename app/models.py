@@ -1,14 +1,26 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import event, Column, Integer, String, Float, ForeignKey, DateTime, JSON
 from sqlalchemy.orm import relationship
 from app.settings.production import Base
 
 
+def utcnow() -> datetime:
+    """Naive UTC timestamp, matching what SQLite and a plain DateTime column store"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 class OrderProduct(Base):
     __tablename__ = "order_products"
 
     order_id = Column(Integer, ForeignKey("orders.id"), primary_key=True)
     product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
     quantity = Column(Integer, nullable=False)
+    # Snapshot of the product at order time, keeps historical totals stable and
+    # lets an order be rendered without joining products
+    unit_price = Column(Float)
+    product_name = Column(String)
 
     # Relationship to Product
     product = relationship("Product")
@@ -22,6 +34,17 @@ class Product(Base):
     description = Column(String)
     price = Column(Float)
     stock = Column(Integer)
+    # Number of stock buckets for striped (hot) products, 0 keeps the stock in the column above
+    stock_buckets = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+class ProductStockBucket(Base):
+    """One slice of a striped product's stock, orders decrement a single bucket row"""
+    __tablename__ = "product_stock_buckets"
+
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+    stock = Column(Integer, nullable=False, default=0)
 
 
 class Order(Base):
@@ -30,6 +53,66 @@ class Order(Base):
     id = Column(Integer, primary_key=True, index=True)
     total_price = Column(Float)
     status = Column(String, default="pending")
+    # Indexed for the archival job, which moves old closed orders to orders_archive
+    created_at = Column(DateTime, nullable=False, default=utcnow, index=True)
 
     # Relationship to OrderProduct
     order_products = relationship("OrderProduct", cascade="all, delete-orphan")
+
+
+class OrderArchive(Base):
+    """
+    Closed orders moved out of the hot tables, one row per order with its lines inline.
+    Range partitioned by month on Postgres, a plain table on SQLite.
+    """
+    __tablename__ = "orders_archive"
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
+
+    # The partition key has to be part of the primary key
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    created_at = Column(DateTime, primary_key=True)
+    total_price = Column(Float)
+    status = Column(String)
+    archived_at = Column(DateTime, nullable=False, default=utcnow)
+    # [{product_id, quantity, unit_price, product_name}, ...]
+    lines = Column(JSON, nullable=False)
+
+
+class Reservation(Base):
+    """Stock held for a cart until expires_at, released by the sweeper if never ordered"""
+    __tablename__ = "reservations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # Indexed so the sweeper finds expired holds without scanning the table
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    items = relationship("ReservationItem", cascade="all, delete-orphan")
+
+
+class ReservationItem(Base):
+    __tablename__ = "reservation_items"
+
+    reservation_id = Column(Integer, ForeignKey("reservations.id"), primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True, index=True)
+    quantity = Column(Integer, nullable=False)
+
+
+class TableVersion(Base):
+    """Change counter per table, bumped in the transaction of every write to it"""
+    __tablename__ = "table_versions"
+
+    name = Column(String(64), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    # Unix timestamp of the last bump, served as Last-Modified
+    modified_at = Column(Float, nullable=False)
+
+
+# Tables whose writes bump a version, seeded like alembic revision 0006 does so bumps only update
+VERSIONED_TABLES = ("orders", "products")
+
+
+@event.listens_for(TableVersion.__table__, "after_create")
+def seed_table_versions(target, connection, **kw):
+    connection.execute(target.insert(), [
+        {"name": name, "version": 0, "modified_at": time.time()} for name in VERSIONED_TABLES
+    ])
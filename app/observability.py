@@ -0,0 +1,137 @@
+import atexit
+import json
+import logging
+import queue
+import time
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+from app.tracing import tracer, current_span
+
+REQUEST_ID_HEADER = b"x-request-id"
+
+request_id_var = ContextVar("request_id", default=None)
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps records with the request and trace ids while still on the request's thread"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        span = current_span.get()
+        record.trace_id = span.trace_id if span is not None else None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class ContextQueueHandler(QueueHandler):
+    """QueueHandler that adds the request context before the record leaves the request thread"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.addFilter(RequestContextFilter())
+
+
+_listener = None
+
+SERVER_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+
+def stop_logging() -> None:
+    """Stop the listener thread of configure_logging, writing out the records still queued"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+SERVER_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+
+def configure_logging(level=logging.INFO, stream_handler=None) -> QueueListener:
+    """
+    Route all logging through a queue so the request path never blocks on I/O,
+    a listener thread formats the records as JSON lines and writes them to stderr.
+    Calling it again replaces the previous handler and stops its listener, the
+    current one is stopped, flushing queued records, when the process exits.
+    """
+    global _listener
+    log_queue = queue.SimpleQueue()
+    stream_handler = stream_handler or logging.StreamHandler()
+    stream_handler.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    for handler in [h for h in root.handlers if isinstance(h, ContextQueueHandler)]:
+        root.removeHandler(handler)
+    root.addHandler(ContextQueueHandler(log_queue))
+    root.setLevel(level)
+    # uvicorn sets up its own synchronous, non-propagating handlers before importing the app,
+    # hand its records to the root queue instead so access lines are JSON with a request_id too
+    for name in SERVER_LOGGERS:
+        server_logger = logging.getLogger(name)
+        server_logger.handlers.clear()
+        server_logger.propagate = True
+
+    stop_logging()
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+atexit.register(stop_logging)
+
+
+class RequestContextMiddleware:
+    """
+    Gives every request an id (taken from X-Request-ID or generated), echoes it
+    in the response and opens the request's root trace span.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                request_id = value.decode("latin-1")[:128]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(REQUEST_ID_HEADER, request_id.encode())]
+                if span is not None:
+                    span.set("http.status_code", message["status"])
+            await send(message)
+
+        try:
+            with tracer.trace(f"{scope['method']} {scope['path']}", **{
+                "http.method": scope["method"], "http.target": scope["path"], "request.id": request_id
+            }) as span:
+                await self.app(scope, receive, send_with_request_id)
+                if span is not None and scope.get("route") is not None:
+                    # Name the span after the route template so traces group by endpoint
+                    span.name = f"{scope['method']} {scope['route'].path}"
+        finally:
+            request_id_var.reset(token)
@@ -0,0 +1,250 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from inspect import isawaitable
+
+logger = logging.getLogger(__name__)
+
+# Token bucket per API key (or client IP), 0 disables rate limiting
+RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", "0"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "20"))
+# Shared bucket state across workers, in process when unset
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+# A Redis call slower than this counts as failed, the worker then limits with its own buckets
+RATE_LIMIT_REDIS_TIMEOUT_SECONDS = float(os.getenv("RATE_LIMIT_REDIS_TIMEOUT_SECONDS", "0.05"))
+# Comma separated API keys that get their own bucket, any other X-API-Key is limited by client IP
+RATE_LIMIT_API_KEYS = frozenset(key.strip() for key in os.getenv("RATE_LIMIT_API_KEYS", "").split(",") if key.strip())
+
+# Requests allowed in flight at once, 0 disables admission control. Keep it below
+# the threadpool size (40) and the DB pool so shedding happens before they saturate
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", "0"))
+# Slots only priority routes (checkout) may use
+PRIORITY_RESERVED_SLOTS = int(os.getenv("PRIORITY_RESERVED_SLOTS", "8"))
+# Cap on concurrent requests for each list endpoint
+LIST_ROUTE_CONCURRENCY = int(os.getenv("LIST_ROUTE_CONCURRENCY", "0"))
+
+PRIORITY_ROUTES = {("POST", "/orders/")}
+LIST_ROUTES = {("GET", "/orders/"), ("GET", "/products/")}
+EXEMPT_PATHS = {"/health", "/ready"}
+
+API_KEY_HEADER = b"x-api-key"
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens, updated):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class InMemoryBackend:
+    """Token buckets kept in this process, one per client key, least recently used first"""
+
+    def __init__(self, rate, burst, max_keys=100_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+
+    def take(self, key) -> float:
+        """Take a token for key, returns 0 when allowed or the seconds until one is available"""
+        now = time.monotonic()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.max_keys:
+                self.prune(now)
+            bucket = self.buckets[key] = TokenBucket(self.burst, now)
+        else:
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+            self.buckets.move_to_end(key)
+
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return 0.0
+        return (1 - bucket.tokens) / self.rate
+
+    def prune(self, now) -> None:
+        """
+        Drop buckets that have refilled, they are equivalent to a new bucket. If that
+        frees nothing, evict the least recently used tenth so the next prune is far off.
+        """
+        refill_seconds = self.burst / self.rate
+        while self.buckets:
+            bucket = next(iter(self.buckets.values()))
+            if now - bucket.updated < refill_seconds:
+                break
+            self.buckets.popitem(last=False)
+
+        target = self.max_keys - max(self.max_keys // 10, 1)
+        while len(self.buckets) > target:
+            self.buckets.popitem(last=False)
+
+
+class RedisBackend:
+    """
+    Token buckets shared by every worker through Redis, needs the optional `redis` package.
+    While Redis errors or times out, requests are limited by in-process buckets instead.
+    """
+
+    SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(state[1]) or burst
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + (now - updated) * rate)
+    local retry_after = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        retry_after = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return tostring(retry_after)
+    """
+
+    def __init__(self, url, rate, burst, timeout=RATE_LIMIT_REDIS_TIMEOUT_SECONDS, client=None):
+        if client is None:
+            import redis.asyncio
+
+            client = redis.asyncio.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self.rate = rate
+        self.burst = burst
+        self.timeout = timeout
+        self.client = client
+        self.script = self.client.register_script(self.SCRIPT)
+        self.fallback = InMemoryBackend(rate, burst)
+        self.failing = False
+
+    async def take(self, key) -> float:
+        try:
+            result = await asyncio.wait_for(
+                self.script(keys=[f"ratelimit:{key}"], args=[self.rate, self.burst, time.time()]), self.timeout
+            )
+        except Exception:
+            # A rate limiter outage must not turn into failed requests
+            if not self.failing:
+                logger.warning("Redis rate limiting failed, limiting per worker until it recovers", exc_info=True)
+                self.failing = True
+            return self.fallback.take(key)
+        if self.failing:
+            logger.info("Redis rate limiting recovered")
+            self.failing = False
+        return float(result)
+
+
+class ConcurrencyLimiter:
+    """Counts requests in flight, the middleware runs on the event loop so no lock is needed"""
+
+    __slots__ = ("limit", "active")
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+
+    def try_acquire(self, headroom=0) -> bool:
+        if self.active >= self.limit - headroom:
+            return False
+        self.active += 1
+        return True
+
+    def release(self) -> None:
+        self.active -= 1
+
+
+def error_response(status_code, detail, retry_after):
+    body = json.dumps({"detail": detail}).encode()
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+        (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+    ]
+    return status_code, headers, body
+
+
+class RateLimitMiddleware:
+    """
+    Pure ASGI middleware doing per client token bucket rate limiting (429) and
+    concurrency admission control (503). Priority routes may use the reserved
+    slots of the global limit, list routes also have their own smaller limit.
+    """
+
+    def __init__(self, app, rate=RATE_LIMIT_PER_SECOND, burst=RATE_LIMIT_BURST, backend=None,
+                 max_in_flight=MAX_IN_FLIGHT, priority_reserved=PRIORITY_RESERVED_SLOTS,
+                 list_route_concurrency=LIST_ROUTE_CONCURRENCY, api_keys=RATE_LIMIT_API_KEYS):
+        self.app = app
+        self.api_keys = api_keys
+        if backend is None and rate > 0:
+            backend = RedisBackend(RATE_LIMIT_REDIS_URL, rate, burst) if RATE_LIMIT_REDIS_URL \
+                else InMemoryBackend(rate, burst)
+        self.backend = backend
+        self.in_flight = ConcurrencyLimiter(max_in_flight) if max_in_flight > 0 else None
+        self.priority_reserved = min(priority_reserved, max(max_in_flight - 1, 0))
+        self.route_limiters = {
+            route: ConcurrencyLimiter(list_route_concurrency) for route in LIST_ROUTES
+        } if list_route_concurrency > 0 else {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            return await self.app(scope, receive, send)
+
+        if self.backend is not None:
+            retry_after = self.backend.take(client_key(scope, self.api_keys))
+            if isawaitable(retry_after):
+                retry_after = await retry_after
+            if retry_after > 0:
+                return await respond(send, *error_response(429, "Rate limit exceeded", retry_after))
+
+        route = (scope["method"], scope["path"])
+        acquired = self.admit(route)
+        if acquired is None:
+            return await respond(send, *error_response(503, "Server busy, retry later", 1))
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            for limiter in acquired:
+                limiter.release()
+
+    def admit(self, route):
+        """Acquire the concurrency slots for route, returns the held limiters or None when shedding"""
+        acquired = []
+        if self.in_flight is not None:
+            headroom = 0 if route in PRIORITY_ROUTES else self.priority_reserved
+            if not self.in_flight.try_acquire(headroom):
+                return None
+            acquired.append(self.in_flight)
+
+        route_limiter = self.route_limiters.get(route)
+        if route_limiter is not None:
+            if not route_limiter.try_acquire():
+                for limiter in acquired:
+                    limiter.release()
+                return None
+            acquired.append(route_limiter)
+        return acquired
+
+
+def client_key(scope, api_keys=frozenset()):
+    """The API key when it is a known one, clients choose unknown ones freely so they count by IP"""
+    for name, value in scope["headers"]:
+        if name == API_KEY_HEADER:
+            api_key = value.decode("latin-1")
+            if api_key in api_keys:
+                return api_key
+            break
+    client = scope.get("client")
+    return client[0] if client else None
+
+
+async def respond(send, status_code, headers, body):
+    await send({"type": "http.response.start", "status": status_code, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,140 @@
+import itertools
+import logging
+import threading
+import time
+
+from sqlalchemy import text, Insert, Update, Delete
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+
+class ReplicaSet:
+    """Round-robins reads over replica engines, skipping the ones that fail a health check"""
+
+    def __init__(self, engines, check_interval=5.0):
+        self.engines = list(engines)
+        self.check_interval = check_interval
+        self._healthy = {id(e): True for e in self.engines}
+        self._checked_at = {id(e): 0.0 for e in self.engines}
+        self._cycle = itertools.cycle(self.engines)
+        self._lock = threading.Lock()
+
+    def check(self, engine) -> bool:
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            healthy = True
+        except SQLAlchemyError:
+            healthy = False
+        self._healthy[id(engine)] = healthy
+        self._checked_at[id(engine)] = time.monotonic()
+        return healthy
+
+    def is_healthy(self, engine) -> bool:
+        if time.monotonic() - self._checked_at[id(engine)] < self.check_interval:
+            return self._healthy[id(engine)]
+        return self.check(engine)
+
+    def mark_unhealthy(self, engine) -> None:
+        self._healthy[id(engine)] = False
+        self._checked_at[id(engine)] = time.monotonic()
+
+    def pick(self):
+        """Return the next healthy replica, or None so the caller falls back to the primary"""
+        for _ in range(len(self.engines)):
+            with self._lock:
+                engine = next(self._cycle)
+            if self.is_healthy(engine):
+                return engine
+        return None
+
+
+class StickyWindow:
+    """
+    Remembers which clients wrote recently so their reads can be pinned to the primary.
+    Keys come from the client, so at most max_keys are kept and the oldest go first.
+    """
+
+    def __init__(self, seconds=5.0, max_keys=100_000):
+        self.seconds = seconds
+        self.max_keys = max_keys
+        self._writes = {}
+        self._lock = threading.Lock()
+
+    def mark(self, client_key) -> None:
+        if client_key is None or self.seconds <= 0:
+            return
+        with self._lock:
+            # Re-insert so the dict stays ordered by expiry
+            self._writes.pop(client_key, None)
+            self._writes[client_key] = time.monotonic() + self.seconds
+            if len(self._writes) > self.max_keys:
+                self.prune()
+
+    def prune(self) -> None:
+        """Drop expired entries from the front, then the oldest ones while over max_keys"""
+        now = time.monotonic()
+        while self._writes:
+            client_key, expiry = next(iter(self._writes.items()))
+            if expiry > now and len(self._writes) <= self.max_keys:
+                break
+            del self._writes[client_key]
+
+    def active(self, client_key) -> bool:
+        expiry = self._writes.get(client_key)
+        if expiry is None:
+            return False
+        if expiry > time.monotonic():
+            return True
+        with self._lock:
+            self._writes.pop(client_key, None)
+        return False
+
+
+class RoutingSession(Session):
+    """
+    Session that sends reads to a replica and writes to the primary bind.
+    Once a session has written anything, every later statement stays on the primary.
+    """
+
+    def __init__(self, *args, replicas: ReplicaSet = None, sticky: StickyWindow = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replicas = replicas
+        self.sticky = sticky
+        self.use_primary = False
+        self.client_key = None
+        self.replica = None
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        primary = super().get_bind(mapper, clause=clause, **kwargs)
+        if self._flushing or isinstance(clause, (Insert, Update, Delete)):
+            self.mark_write()
+            return primary
+        if self.use_primary or self.replicas is None:
+            return primary
+        if getattr(clause, "_for_update_arg", None) is not None:
+            return primary
+        self.replica = self.replicas.pick()
+        return self.replica or primary
+
+    def execute(self, statement, *args, **kwargs):
+        self.replica = None
+        try:
+            return super().execute(statement, *args, **kwargs)
+        except OperationalError:
+            if self.replica is None or self.use_primary:
+                raise
+            # The replica died since its last health check, skip it and read this session from the primary.
+            # Nothing was written yet, so dropping the transaction holding the dead connection loses nothing.
+            logger.warning("Read replica failed, falling back to the primary", exc_info=True)
+            self.replicas.mark_unhealthy(self.replica)
+            self.rollback()
+            self.use_primary = True
+            return super().execute(statement, *args, **kwargs)
+
+    def mark_write(self) -> None:
+        self.use_primary = True
+        if self.sticky is not None:
+            self.sticky.mark(self.client_key)
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import os
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from app import schemas, exception
+from app.cache import table_versions, invalidate_products
+from app.inventory import restore_striped_stock
+from app.models import Product, Reservation, ReservationItem, utcnow
+
+logger = logging.getLogger(__name__)
+
+RESERVATION_SWEEP_INTERVAL_SECONDS = float(os.getenv("RESERVATION_SWEEP_INTERVAL_SECONDS", "30"))
+RESERVATION_SWEEP_BATCH_SIZE = int(os.getenv("RESERVATION_SWEEP_BATCH_SIZE", "1000"))
+
+
+def expiry_after(ttl_seconds: int) -> datetime:
+    return utcnow() + timedelta(seconds=ttl_seconds)
+
+
+def consume_reservation(db: Session, reservation_id: int) -> list[schemas.OrderProductItem]:
+    """Delete a live reservation and return its items, their stock stays taken for the order"""
+    reservation = db.query(Reservation).filter(
+        Reservation.id == reservation_id, Reservation.expires_at > utcnow()
+    ).with_for_update().first()
+    if reservation is None:
+        raise exception.ReservationNotFoundError(reservation_id)
+
+    items = [
+        schemas.OrderProductItem(product_id=item.product_id, quantity=item.quantity)
+        for item in reservation.items
+    ]
+    db.delete(reservation)
+    return items
+
+
+def held_stock(db: Session, product_ids: list[int]) -> dict:
+    """Quantity held by live reservations for each product"""
+    rows = db.query(ReservationItem.product_id, func.sum(ReservationItem.quantity)).join(
+        Reservation, Reservation.id == ReservationItem.reservation_id
+    ).filter(
+        ReservationItem.product_id.in_(product_ids), Reservation.expires_at > utcnow()
+    ).group_by(ReservationItem.product_id).all()
+    return {product_id: int(quantity) for product_id, quantity in rows}
+
+
+def release_stock(db: Session, quantities: dict) -> None:
+    """Put quantities (product id -> quantity) back into stock"""
+    striped = {
+        p.id: p.stock_buckets for p in db.query(Product.id, Product.stock_buckets).filter(
+            Product.id.in_(quantities.keys()), Product.stock_buckets > 0
+        )
+    }
+    for product_id, quantity in quantities.items():
+        if product_id in striped:
+            restore_striped_stock(db, product_id, [(random.randrange(striped[product_id]), quantity)])
+        else:
+            db.execute(
+                update(Product).where(Product.id == product_id).values(stock=Product.stock + quantity)
+            )
+
+
+def release_expired_reservations(db: Session, now: datetime = None,
+                                 limit: int = RESERVATION_SWEEP_BATCH_SIZE) -> int:
+    """
+    Release up to limit expired reservations in bulk: one indexed range query
+    on expires_at, one grouped sum of their items and one update per product.
+    """
+    now = now or utcnow()
+    reservation_ids = [row.id for row in db.query(Reservation.id).filter(
+        Reservation.expires_at <= now
+    ).order_by(Reservation.expires_at).limit(limit).with_for_update(skip_locked=True)]
+    if not reservation_ids:
+        return 0
+
+    quantities = dict(db.query(ReservationItem.product_id, func.sum(ReservationItem.quantity)).filter(
+        ReservationItem.reservation_id.in_(reservation_ids)
+    ).group_by(ReservationItem.product_id).all())
+    release_stock(db, quantities)
+
+    db.query(ReservationItem).filter(
+        ReservationItem.reservation_id.in_(reservation_ids)
+    ).delete(synchronize_session=False)
+    db.query(Reservation).filter(Reservation.id.in_(reservation_ids)).delete(synchronize_session=False)
+    table_versions.bump("products", db=db)
+    db.commit()
+
+    invalidate_products(quantities.keys())
+    return len(reservation_ids)
+
+
+def sweep_expired_reservations(session_factory) -> int:
+    """Release every expired reservation, batch by batch"""
+    released = 0
+    db = session_factory()
+    db.use_primary = True
+    try:
+        while True:
+            count = release_expired_reservations(db)
+            released += count
+            if count < RESERVATION_SWEEP_BATCH_SIZE:
+                return released
+    finally:
+        db.close()
+
+
+async def run_sweeper(session_factory, interval: float = RESERVATION_SWEEP_INTERVAL_SECONDS) -> None:
+    """Background task releasing expired holds every interval seconds"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            released = await asyncio.to_thread(sweep_expired_reservations, session_factory)
+            if released:
+                logger.info(f"Released {released} expired reservations")
+        except Exception:
+            logger.exception("Reservation sweep failed")
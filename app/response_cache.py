@@ -0,0 +1,155 @@
+import os
+import re
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode
+
+from app.cache import table_versions
+from app.compression import choose_encoding
+from app.conditional import etag_matches
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+# Upper bound on staleness across workers, a write only invalidates its own process' entries
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "30"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+RESPONSE_CACHE_MAX_BODY_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BODY_BYTES", str(1024 * 1024)))
+
+# Path prefix -> tags, the tables write views bump through table_versions when they change them
+CACHED_PATHS = (
+    ("/orders/", ("orders",)),
+    ("/products/", ("products",)),
+)
+# A single order or product is tagged with that entity only (order_{id}, product_{id}), so a checkout
+# only drops the products it took stock from. Orders never change once placed
+ENTITY_PATH = re.compile(r"/(order|product)s/(\d+)$")
+# Requests carrying these are not anonymous, or want to bypass shared state, and are never cached
+BYPASS_HEADERS = {b"authorization", b"cookie", b"x-read-primary"}
+UNCACHEABLE_CACHE_CONTROL = ("no-store", "private")
+
+
+def normalized_query(query_string: bytes) -> str:
+    return urlencode(sorted(parse_qsl(query_string.decode("latin-1"), keep_blank_values=True)))
+
+
+class CachedResponse:
+    __slots__ = ("status", "headers", "body", "etag", "versions", "expires")
+
+    def __init__(self, status, headers, body, etag, versions, expires):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.etag = etag
+        self.versions = versions
+        self.expires = expires
+
+
+class ResponseCacheMiddleware:
+    """
+    Caches the encoded bytes of anonymous GET responses and replays them without
+    routing, opening a session or serializing. Entries are tagged with the order or
+    product they show, or the table for lists, and dropped once a write bumps a tag.
+    """
+
+    def __init__(self, app, ttl_seconds=RESPONSE_CACHE_TTL_SECONDS, max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+                 max_body_bytes=RESPONSE_CACHE_MAX_BODY_BYTES, versions=table_versions):
+        self.app = app
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_body_bytes = max_body_bytes
+        self.versions = versions
+        self.entries = OrderedDict()
+
+    def tags_for(self, path: str):
+        match = ENTITY_PATH.match(path)
+        if match:
+            return (f"{match.group(1)}_{match.group(2)}",)
+        for prefix, tags in CACHED_PATHS:
+            if path.startswith(prefix):
+                return tags
+        return None
+
+    def current_versions(self, tags) -> tuple:
+        return tuple(self.versions.versions.get(tag, 0) for tag in tags)
+
+    def lookup(self, key, tags):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires <= time.time() or entry.versions != self.current_versions(tags):
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def store(self, key, entry) -> None:
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            return await self.app(scope, receive, send)
+        tags = self.tags_for(scope["path"])
+        if tags is None:
+            return await self.app(scope, receive, send)
+
+        accept_encoding = ""
+        if_none_match = None
+        for name, value in scope["headers"]:
+            if name in BYPASS_HEADERS:
+                return await self.app(scope, receive, send)
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+            elif name == b"if-none-match":
+                if_none_match = value.decode("latin-1")
+
+        key = (scope["path"], normalized_query(scope["query_string"]), choose_encoding(accept_encoding))
+        entry = self.lookup(key, tags)
+        if entry is not None:
+            return await self.replay(entry, if_none_match, send)
+
+        # Read before the app runs, a write landing mid-request then leaves the entry already stale
+        versions = self.current_versions(tags)
+        start_message = None
+        chunks = []
+        size = 0
+
+        async def send_and_capture(message):
+            nonlocal start_message, size
+            if message["type"] == "http.response.start":
+                start_message = message
+                message["headers"] = list(message.get("headers", [])) + [(b"x-cache", b"MISS")]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                size += len(chunks[-1])
+                if not message.get("more_body", False) and size <= self.max_body_bytes:
+                    self.maybe_store(key, start_message, b"".join(chunks), versions)
+            await send(message)
+
+        await self.app(scope, receive, send_and_capture)
+
+    def maybe_store(self, key, start_message, body, versions) -> None:
+        if start_message is None or start_message["status"] != 200:
+            return
+        headers = [(name, value) for name, value in start_message["headers"] if name != b"x-cache"]
+        etag = None
+        for name, value in headers:
+            if name == b"set-cookie":
+                return
+            if name == b"cache-control" and any(d in value.decode("latin-1") for d in UNCACHEABLE_CACHE_CONTROL):
+                return
+            if name == b"etag":
+                etag = value.decode("latin-1")
+        self.store(key, CachedResponse(200, headers, body, etag, versions, time.time() + self.ttl_seconds))
+
+    async def replay(self, entry, if_none_match, send) -> None:
+        if entry.etag and if_none_match and etag_matches(if_none_match, entry.etag):
+            headers = [(name, value) for name, value in entry.headers
+                       if name in (b"etag", b"cache-control", b"last-modified", b"vary")]
+            await send({"type": "http.response.start", "status": 304, "headers": headers + [(b"x-cache", b"HIT")]})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await send({"type": "http.response.start", "status": entry.status,
+                    "headers": entry.headers + [(b"x-cache", b"HIT")]})
+        await send({"type": "http.response.body", "body": entry.body})
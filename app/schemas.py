@@ -1,6 +1,11 @@
+from datetime import datetime
 from typing import List, Optional
-from pydantic import BaseModel, Field, field_validator, ConfigDict
+from pydantic import BaseModel, Field, field_validator, model_validator, ConfigDict
 from enum import Enum
+import os
+
+RESERVATION_TTL_SECONDS = int(os.getenv("RESERVATION_TTL_SECONDS", "900"))
+RESERVATION_MAX_TTL_SECONDS = int(os.getenv("RESERVATION_MAX_TTL_SECONDS", "3600"))
 
 
 class OrderStatus(str, Enum):
@@ -25,20 +30,48 @@ class Product(ProductBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class ProductDetail(Product):
+    # stock is what can still be ordered, held is taken by live cart reservations
+    available: int
+    held: int
+
+
+class ProductBatchRequest(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=1000)
+
+
+class ProductBatch(BaseModel):
+    # Found products in request order, unknown ids are listed in missing
+    products: List[Product]
+    missing: List[int]
+
+
 class OrderProductItem(BaseModel):
     product_id: int
     quantity: int = Field(gt=0)
 
 
+def unique_products(items: List[OrderProductItem]) -> List[OrderProductItem]:
+    """Each product may appear once, its line is keyed by (order, product)"""
+    product_ids = [item.product_id for item in items]
+    if len(product_ids) != len(set(product_ids)):
+        raise ValueError('Each product may only be listed once, combine the quantities instead')
+    return items
+
+
 class OrderCreate(BaseModel):
-    products: List[OrderProductItem]
+    products: List[OrderProductItem] = []
+    # Place the order from a reservation's held stock instead of listing products
+    reservation_id: Optional[int] = None
 
-    @field_validator("products")
-    @classmethod
-    def must_have_products(cls, v):
-        if not v:
+    @model_validator(mode="after")
+    def must_have_products(self):
+        if self.reservation_id is None and not self.products:
             raise ValueError('Order must contain at least one product')
-        return v
+        if self.reservation_id is not None and self.products:
+            raise ValueError('Order takes either products or a reservation_id, not both')
+        unique_products(self.products)
+        return self
 
 
 class Order(BaseModel):
@@ -50,6 +83,34 @@ class Order(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class OrderLine(OrderProductItem):
+    product_name: Optional[str] = None
+    unit_price: Optional[float] = None
+    line_total: Optional[float] = None
+
+
+class OrderExpanded(Order):
+    products: List[OrderLine]
+
+
+class ReservationCreate(BaseModel):
+    products: List[OrderProductItem]
+    ttl_seconds: int = Field(default=RESERVATION_TTL_SECONDS, gt=0, le=RESERVATION_MAX_TTL_SECONDS)
+
+    @field_validator("products")
+    @classmethod
+    def must_have_products(cls, v):
+        if not v:
+            raise ValueError('Reservation must contain at least one product')
+        return unique_products(v)
+
+
+class Reservation(BaseModel):
+    id: int
+    products: List[OrderProductItem]
+    expires_at: datetime
+
+
 class OrderProductBase(BaseModel):
     order_id: int
     product_id: int
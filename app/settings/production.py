@@ -1,21 +1,68 @@
+from fastapi import Request
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
 
+from app.replicas import ReplicaSet, RoutingSession, StickyWindow
+
 # Get database URL from environment variable or use SQLite as default
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./ecommerce.db")
 
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+# Optional comma separated read replica URLs, reads use the primary when none are set
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_CHECK_INTERVAL_SECONDS = float(os.getenv("REPLICA_CHECK_INTERVAL_SECONDS", "5"))
+
+# How long a client's reads stay on the primary after it wrote something
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+# Clients remembered at once, the oldest are forgotten first past this
+READ_YOUR_WRITES_MAX_CLIENTS = int(os.getenv("READ_YOUR_WRITES_MAX_CLIENTS", "100000"))
+
+# Request headers that force a primary read and identify the client for the sticky window
+READ_PRIMARY_HEADER = "X-Read-Primary"
+CLIENT_ID_HEADER = "X-Client-Id"
+
+
+def make_engine(url: str):
+    return create_engine(
+        url, connect_args={"check_same_thread": False} if url.startswith("sqlite") else {}
+    )
+
+
+engine = make_engine(DATABASE_URL)
+replicas = ReplicaSet(
+    [make_engine(url) for url in DATABASE_REPLICA_URLS], check_interval=REPLICA_CHECK_INTERVAL_SECONDS
+) if DATABASE_REPLICA_URLS else None
+sticky_writes = StickyWindow(READ_YOUR_WRITES_SECONDS, max_keys=READ_YOUR_WRITES_MAX_CLIENTS)
+
+SessionLocal = sessionmaker(
+    class_=RoutingSession, autocommit=False, autoflush=False, bind=engine,
+    replicas=replicas, sticky=sticky_writes,
 )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
 
+def client_key(request: Request):
+    """
+    Identify the client for read-your-writes by its explicit id. The remote address is
+    not used, behind a load balancer or NAT it is shared and one write would send every
+    client's reads to the primary.
+    """
+    return request.headers.get(CLIENT_ID_HEADER) or None
+
+
+# Methods whose reads may come from a replica, anything else reads what it is about to write
+READ_ONLY_METHODS = ("GET", "HEAD")
+
+
 # Dependency to get DB session
-def get_db():
+def get_db(request: Request):
     db = SessionLocal()
+    db.client_key = client_key(request)
+    if request.method not in READ_ONLY_METHODS \
+            or request.headers.get(READ_PRIMARY_HEADER, "").lower() in ("1", "true", "yes") \
+            or sticky_writes.active(db.client_key):
+        db.use_primary = True
     try:
         yield db
     finally:
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.settings.production import engine, Base, SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# "create" always runs create_all, "skip" never does and "auto" skips it once
+# alembic has stamped the database (the Dockerfile runs `alembic upgrade head` first)
+SCHEMA_MODE = os.getenv("STARTUP_SCHEMA_MODE", "auto")
+WARMUP_CONNECTIONS = int(os.getenv("STARTUP_WARMUP_CONNECTIONS", "5"))
+# Hot key snapshots are opt-in, app.warming is only imported when they are on
+HOT_KEYS_ENABLED = bool(os.getenv("CACHE_HOT_KEYS_PATH"))
+
+
+def migrations_applied(bind: Engine = engine) -> bool:
+    """Check for an alembic revision with a single query instead of reflecting every table"""
+    try:
+        with bind.connect() as conn:
+            return conn.execute(text("SELECT version_num FROM alembic_version")).first() is not None
+    except SQLAlchemyError:
+        return False
+
+
+def prepare_schema(bind: Engine = engine, mode: str = SCHEMA_MODE) -> None:
+    """Create missing tables unless the schema is managed by migrations"""
+    if mode == "skip":
+        return
+    if mode == "auto" and migrations_applied(bind):
+        logger.info("Migrations already applied, skipping create_all")
+        return
+    Base.metadata.create_all(bind=bind)
+
+
+def warm_connection_pool(bind: Engine = engine, connections: int = WARMUP_CONNECTIONS) -> int:
+    """Open pooled connections in parallel so the first requests don't pay for the handshake"""
+    pool_size = getattr(bind.pool, "size", None)
+    if callable(pool_size):
+        connections = min(connections, pool_size())
+    if connections <= 0:
+        return 0
+
+    def connect(_):
+        conn = bind.connect()
+        conn.execute(text("SELECT 1"))
+        return conn
+
+    # Hold every connection until all are open, otherwise the pool hands the same one back
+    with ThreadPoolExecutor(max_workers=connections) as executor:
+        opened = list(executor.map(connect, range(connections)))
+    for conn in opened:
+        conn.close()
+    return len(opened)
+
+
+def warm_orders_cache():
+    from app.views import orders
+
+    db = SessionLocal()
+    try:
+        orders.list_orders(db)
+    finally:
+        db.close()
+
+
+def warm_hot_keys():
+    from app.warming import warm_hot_keys
+
+    warm_hot_keys()
+
+
+# Callables that populate the in-process caches, run in parallel during warm-up
+CACHE_WARMERS = [warm_orders_cache] + ([warm_hot_keys] if HOT_KEYS_ENABLED else [])
+
+
+async def warm_up(app, warmers=None, bind: Engine = engine) -> None:
+    """Warm the connection pool and the caches in parallel, then mark the app ready"""
+    warmers = CACHE_WARMERS if warmers is None else warmers
+    tasks = [asyncio.to_thread(warm_connection_pool, bind)]
+    tasks += [asyncio.to_thread(warmer) for warmer in warmers]
+
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            # A failed warm-up only costs latency, the app can still serve traffic
+            logger.warning(f"Warm-up step failed: {result}")
+
+    app.state.ready = True
+    logger.info("Warm-up finished, app is ready")
@@ -0,0 +1,76 @@
+from datetime import date, timedelta
+
+import pytest
+
+from app.archive import archive_orders, next_month, partition_ddl
+from app.cache import order_cache
+from app.models import Order, OrderArchive, OrderProduct, Product, utcnow
+from app.tests.setup import client, test_db
+
+
+@pytest.fixture(autouse=True)
+def clear_order_cache():
+    order_cache.invalidate()
+
+
+def add_order(test_db, status="completed", age_days=0):
+    product = Product(name="Product", description="Description", price=10.0, stock=10)
+    test_db.add(product)
+    test_db.flush()
+    order = Order(status=status, total_price=20.0, created_at=utcnow() - timedelta(days=age_days))
+    test_db.add(order)
+    test_db.flush()
+    test_db.add(OrderProduct(order_id=order.id, product_id=product.id, quantity=2,
+                             unit_price=10.0, product_name="Product"))
+    test_db.commit()
+    return order.id, product.id
+
+
+class TestArchiveOrders:
+    def test_moves_only_old_closed_orders(self, test_db):
+        old_id, _ = add_order(test_db, age_days=200)
+        recent_id, _ = add_order(test_db, age_days=1)
+        pending_id, _ = add_order(test_db, status="pending", age_days=200)
+
+        assert archive_orders(test_db, older_than_days=90) == 1
+
+        assert {o.id for o in test_db.query(Order)} == {recent_id, pending_id}
+        assert test_db.query(OrderProduct).filter(OrderProduct.order_id == old_id).count() == 0
+        archived = test_db.query(OrderArchive).one()
+        assert archived.id == old_id
+        assert archived.lines[0]["quantity"] == 2
+
+    def test_archives_in_batches(self, test_db):
+        for _ in range(5):
+            add_order(test_db, age_days=200)
+
+        assert archive_orders(test_db, older_than_days=90, batch_size=2) == 5
+        assert test_db.query(Order).count() == 0
+        assert test_db.query(OrderArchive).count() == 5
+
+    def test_archived_order_is_still_readable_by_id(self, client, test_db):
+        order_id, product_id = add_order(test_db, age_days=200)
+        archive_orders(test_db, older_than_days=90)
+
+        response = client.get(f"/orders/{order_id}")
+        assert response.status_code == 200
+        assert response.json()["products"] == [{"product_id": product_id, "quantity": 2}]
+
+        data = client.get(f"/orders/{order_id}?expand=products").json()
+        assert data["products"][0]["line_total"] == 20.0
+        assert data["products"][0]["product_name"] == "Product"
+
+        # Archived orders drop out of the list
+        assert client.get("/orders/").json() == []
+
+
+class TestPartitions:
+    def test_next_month_rolls_over_the_year(self):
+        assert next_month(date(2026, 12, 1)) == date(2027, 1, 1)
+        assert next_month(date(2026, 3, 1)) == date(2026, 4, 1)
+
+    def test_partition_ddl(self):
+        assert partition_ddl(date(2026, 12, 1)) == (
+            "CREATE TABLE IF NOT EXISTS orders_archive_2026_12 PARTITION OF orders_archive "
+            "FOR VALUES FROM ('2026-12-01') TO ('2027-01-01')"
+        )
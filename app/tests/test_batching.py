@@ -0,0 +1,62 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.batching import GroupCommitter
+
+
+class TestGroupCommitter:
+    def test_concurrent_submits_share_a_batch(self):
+        batches = []
+
+        def handler(items):
+            batches.append(list(items))
+            return [item * 2 for item in items]
+
+        committer = GroupCommitter(handler, window=0.2, max_size=4)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(committer.submit, [1, 2, 3, 4]))
+
+        assert results == [2, 4, 6, 8]
+        assert sorted(item for batch in batches for item in batch) == [1, 2, 3, 4]
+        assert len(batches) < 4
+
+    def test_batch_closes_at_max_size(self):
+        committer = GroupCommitter(lambda items: items, window=0.05, max_size=2)
+        for item in (1, 2, 3):
+            committer.queue.put((item, None))
+
+        assert [item for item, _ in committer.next_batch()] == [1, 2]
+        assert [item for item, _ in committer.next_batch()] == [3]
+
+    def test_exception_result_only_fails_its_caller(self):
+        committer = GroupCommitter(
+            lambda items: [ValueError(item) if item < 0 else item for item in items], window=0.05
+        )
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            ok = executor.submit(committer.submit, 1)
+            failed = executor.submit(committer.submit, -1)
+
+        assert ok.result() == 1
+        with pytest.raises(ValueError):
+            failed.result()
+
+    def test_handler_failure_fails_the_whole_batch(self):
+        def handler(items):
+            raise RuntimeError("commit failed")
+
+        committer = GroupCommitter(handler, window=0.001)
+
+        with pytest.raises(RuntimeError):
+            committer.submit(1)
+
+    def test_stuck_batch_times_out(self):
+        release = threading.Event()
+        committer = GroupCommitter(lambda items: release.wait() and items, window=0.001, timeout=0.05)
+
+        try:
+            with pytest.raises(TimeoutError):
+                committer.submit(1)
+        finally:
+            release.set()
@@ -0,0 +1,94 @@
+import gzip
+
+import brotli
+from fastapi import FastAPI, Response
+from fastapi.responses import PlainTextResponse
+from fastapi.testclient import TestClient
+
+from app.compression import CompressionMiddleware, choose_encoding
+
+BIG_PAYLOAD = [{"name": "Product", "description": "Description"}] * 100
+
+
+def make_client(**options):
+    app = FastAPI()
+
+    @app.get("/big")
+    def big():
+        return BIG_PAYLOAD
+
+    @app.get("/tagged")
+    def tagged(response: Response):
+        response.headers["ETag"] = '"v1"'
+        return BIG_PAYLOAD
+
+    @app.get("/small")
+    def small():
+        return {"status": "ok"}
+
+    @app.get("/binary")
+    def binary():
+        return PlainTextResponse("x" * 5000, media_type="application/octet-stream")
+
+    return TestClient(CompressionMiddleware(app, **options))
+
+
+class TestChooseEncoding:
+    def test_prefers_brotli_when_available(self):
+        assert choose_encoding("gzip, deflate, br") == "br"
+        assert choose_encoding("gzip, deflate, br", brotli_available=False) == "gzip"
+
+    def test_respects_q_zero_and_missing_header(self):
+        assert choose_encoding("br;q=0, gzip") == "gzip"
+        assert choose_encoding("") is None
+
+    def test_parses_q_values(self):
+        assert choose_encoding("br;q=0.00, gzip;q=0.5") == "gzip"
+        assert choose_encoding("gzip;q=0.0") is None
+        assert choose_encoding("gzip; q=0.001") == "gzip"
+        assert choose_encoding("br;q=bogus, gzip") == "gzip"
+
+
+class TestCompressionMiddleware:
+    def test_gzip_large_json(self):
+        response = make_client().get("/big", headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert response.json() == BIG_PAYLOAD
+
+    def test_compressed_responses_get_a_weak_etag(self):
+        client = make_client()
+
+        assert client.get("/tagged", headers={"Accept-Encoding": "gzip"}).headers["etag"] == 'W/"v1"'
+        assert client.get("/tagged", headers={"Accept-Encoding": "identity"}).headers["etag"] == '"v1"'
+
+    def test_brotli_large_json(self):
+        client = make_client(brotli_quality=5)
+        response = client.get("/big", headers={"Accept-Encoding": "br"})
+
+        assert response.headers["content-encoding"] == "br"
+        assert int(response.headers["content-length"]) < len(str(BIG_PAYLOAD))
+
+    def test_small_bodies_are_not_compressed(self):
+        response = make_client().get("/small", headers={"Accept-Encoding": "gzip"})
+
+        assert "content-encoding" not in response.headers
+        assert response.json() == {"status": "ok"}
+
+    def test_threshold_is_configurable(self):
+        response = make_client(minimum_size=10).get("/small", headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers["content-encoding"] == "gzip"
+
+    def test_non_compressible_types_are_untouched(self):
+        response = make_client().get("/binary", headers={"Accept-Encoding": "gzip"})
+
+        assert "content-encoding" not in response.headers
+
+    def test_gzip_level_is_applied(self):
+        middleware = CompressionMiddleware(None, gzip_level=1)
+        body = b'{"name": "Product"}' * 500
+
+        assert gzip.decompress(middleware.compress(body, "gzip")) == body
+        assert brotli.decompress(middleware.compress(body, "br")) == body
@@ -0,0 +1,116 @@
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app import exception, schemas
+from app.cache import stock_cache
+from app.inventory import (
+    disable_striping,
+    enable_striping,
+    rebalance_stock,
+    take_striped_stock,
+)
+from app.models import Order, Product, ProductStockBucket
+from app.tests.setup import client, test_db
+from app.views.orders import create_orders_batch, process_order_items
+
+
+@pytest.fixture(autouse=True)
+def clear_stock_cache():
+    stock_cache.invalidate()
+
+
+def add_product(test_db, stock, buckets=0):
+    product = Product(name="Hot item", description="Flash sale", price=5.0, stock=stock)
+    test_db.add(product)
+    test_db.commit()
+    if buckets:
+        enable_striping(test_db, product.id, buckets)
+    test_db.refresh(product)
+    return product
+
+
+def bucket_stocks(test_db, product_id):
+    test_db.expire_all()
+    return [b.stock for b in test_db.query(ProductStockBucket).filter(
+        ProductStockBucket.product_id == product_id).order_by(ProductStockBucket.bucket)]
+
+
+class TestStriping:
+    def test_enable_splits_stock_evenly(self, test_db):
+        product = add_product(test_db, stock=10, buckets=4)
+
+        assert bucket_stocks(test_db, product.id) == [3, 3, 2, 2]
+        assert product.stock == 0
+        assert product.stock_buckets == 4
+
+    def test_get_product_reports_summed_stock(self, client, test_db):
+        product = add_product(test_db, stock=10, buckets=4)
+
+        assert client.get(f"/products/{product.id}").json()["stock"] == 10
+        assert client.get("/products/").json()[0]["stock"] == 10
+
+    def test_order_decrements_a_single_bucket(self, client, test_db):
+        product = add_product(test_db, stock=10, buckets=4)
+
+        response = client.post("/orders/", json={"products": [{"product_id": product.id, "quantity": 2}]})
+
+        assert response.status_code == 201
+        assert sum(bucket_stocks(test_db, product.id)) == 8
+        assert sorted(bucket_stocks(test_db, product.id)) in ([0, 2, 3, 3], [1, 2, 2, 3])
+
+    def test_order_larger_than_any_bucket_drains_several(self, test_db):
+        product = add_product(test_db, stock=10, buckets=4)
+
+        taken = take_striped_stock(test_db, product, 7)
+
+        assert sum(amount for _, amount in taken) == 7
+        assert sum(bucket_stocks(test_db, product.id)) == 3
+
+    def test_insufficient_stock_leaves_buckets_alone(self, client, test_db):
+        product = add_product(test_db, stock=10, buckets=4)
+
+        response = client.post("/orders/", json={"products": [{"product_id": product.id, "quantity": 11}]})
+
+        assert response.status_code == 400
+        assert "10 available" in response.json()["detail"]
+        assert bucket_stocks(test_db, product.id) == [3, 3, 2, 2]
+
+    def test_failed_item_restores_buckets_taken_for_earlier_items(self, test_db):
+        first = add_product(test_db, stock=10, buckets=2)
+        second = add_product(test_db, stock=1, buckets=2)
+        items = [schemas.OrderProductItem(product_id=first.id, quantity=4),
+                 schemas.OrderProductItem(product_id=second.id, quantity=2)]
+
+        with pytest.raises(exception.InsufficientStockError):
+            process_order_items(1, items, {first.id: first, second.id: second}, test_db)
+
+        assert bucket_stocks(test_db, first.id) == [5, 5]
+
+    def test_batch_drops_order_when_bucket_runs_out(self, test_db):
+        product = add_product(test_db, stock=3, buckets=2)
+        orders = [schemas.OrderCreate(products=[schemas.OrderProductItem(product_id=product.id, quantity=2)])] * 2
+
+        results = create_orders_batch(orders, session_factory=sessionmaker(bind=test_db.get_bind()))
+
+        assert isinstance(results[0], schemas.Order)
+        assert isinstance(results[1], exception.InsufficientStockError)
+        test_db.expire_all()
+        assert test_db.query(Order).count() == 1
+        assert sum(bucket_stocks(test_db, product.id)) == 1
+
+    def test_rebalance_evens_buckets(self, test_db):
+        product = add_product(test_db, stock=10, buckets=4)
+        test_db.query(ProductStockBucket).filter(ProductStockBucket.bucket == 0).update({"stock": 0})
+        test_db.commit()
+
+        assert rebalance_stock(test_db, product.id) == [2, 2, 2, 1]
+
+    def test_disable_collapses_buckets(self, test_db):
+        product = add_product(test_db, stock=10, buckets=4)
+
+        disable_striping(test_db, product.id)
+
+        test_db.refresh(product)
+        assert product.stock == 10
+        assert product.stock_buckets == 0
+        assert bucket_stocks(test_db, product.id) == []
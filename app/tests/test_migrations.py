@@ -0,0 +1,41 @@
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, inspect, text
+
+from app.settings.production import Base
+
+
+def migrate(monkeypatch, tmp_path, revision="head"):
+    url = f"sqlite:///{tmp_path}/migrations.db"
+    monkeypatch.setenv("DATABASE_URL", url)
+    config = Config()
+    config.set_main_option("script_location", "alembic")
+    command.upgrade(config, revision)
+    return config, create_engine(url)
+
+
+class TestMigrations:
+    def test_head_matches_models(self, monkeypatch, tmp_path):
+        config, engine = migrate(monkeypatch, tmp_path)
+
+        with engine.connect() as conn:
+            assert compare_metadata(MigrationContext.configure(conn), Base.metadata) == []
+
+        command.downgrade(config, "base")
+        assert inspect(engine).get_table_names() == ["alembic_version"]
+
+    def test_existing_rows_are_backfilled(self, monkeypatch, tmp_path):
+        config, engine = migrate(monkeypatch, tmp_path, "0001")
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO products (id, name, price, stock) VALUES (1, 'Old', 2.5, 3)"))
+            conn.execute(text("INSERT INTO orders (id, total_price, status) VALUES (1, 5.0, 'completed')"))
+            conn.execute(text("INSERT INTO order_products VALUES (1, 1, 2)"))
+
+        command.upgrade(config, "head")
+
+        with engine.connect() as conn:
+            assert conn.execute(text("SELECT created_at IS NOT NULL FROM orders")).scalar()
+            assert conn.execute(text("SELECT unit_price, product_name FROM order_products")).one() == (2.5, "Old")
+            assert conn.execute(text("SELECT stock_buckets FROM products")).scalar() == 0
@@ -0,0 +1,159 @@
+import io
+import json
+import logging
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from app.cache import Cache
+from app.observability import JsonFormatter, RequestContextMiddleware, configure_logging, request_id_var
+from app.tests.setup import client, test_db
+from app.trace_export import FileExporter
+from app.tracing import Span, instrument_engine, tracer
+
+
+class ListExporter:
+    def __init__(self):
+        self.traces = []
+
+    def export(self, spans):
+        self.traces.append(spans)
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    exporter = ListExporter()
+    monkeypatch.setattr(tracer, "exporter", exporter)
+    monkeypatch.setattr(tracer, "sample_rate", 1.0)
+    return exporter
+
+
+def make_client():
+    app = FastAPI()
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+    cache = Cache()
+
+    @app.get("/items/{item_id}")
+    def get_item(item_id: int):
+        logging.getLogger("app.tests").info("Looking up item")
+        cache.get(f"item_{item_id}")
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        return {"id": item_id}
+
+    return TestClient(RequestContextMiddleware(app))
+
+
+class TestRequestId:
+    def test_generated_and_echoed(self):
+        client = make_client()
+        generated = client.get("/items/1").headers["X-Request-ID"]
+        assert len(generated) == 32
+
+        response = client.get("/items/1", headers={"X-Request-ID": "abc-123"})
+        assert response.headers["X-Request-ID"] == "abc-123"
+
+    def test_app_sets_header(self, client):
+        assert client.get("/health").headers["X-Request-ID"]
+
+
+class TestLogging:
+    def test_json_lines_carry_request_id(self):
+        out = io.StringIO()
+        configure_logging(stream_handler=logging.StreamHandler(out))
+        try:
+            make_client().get("/items/1", headers={"X-Request-ID": "req-1"})
+            deadline = time.time() + 2
+            while "Looking up item" not in out.getvalue():
+                assert time.time() < deadline
+                time.sleep(0.01)
+        finally:
+            configure_logging()
+
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        entry = next(line for line in lines if line["message"] == "Looking up item")
+        assert entry["request_id"] == "req-1"
+        assert entry["level"] == "INFO"
+        assert request_id_var.get() is None
+
+    def test_reconfiguring_stops_the_previous_listener(self):
+        out = io.StringIO()
+        previous = configure_logging(stream_handler=logging.StreamHandler(out))
+        logging.getLogger("app.tests").info("Before reconfiguring")
+
+        current = configure_logging()
+
+        assert previous._thread is None
+        assert current._thread is not None
+        # Records queued before the switch are written out by the old listener
+        assert "Before reconfiguring" in out.getvalue()
+
+    def test_uvicorn_access_log_goes_through_the_queue(self):
+        access = logging.getLogger("uvicorn.access")
+        direct = io.StringIO()
+        access.addHandler(logging.StreamHandler(direct))
+        access.propagate = False
+        out = io.StringIO()
+
+        configure_logging(stream_handler=logging.StreamHandler(out))
+        token = request_id_var.set("req-2")
+        try:
+            access.info('%s - "%s %s HTTP/%s" %d', "10.0.0.1:1234", "GET", "/health", "1.1", 200)
+        finally:
+            request_id_var.reset(token)
+        configure_logging()
+
+        assert direct.getvalue() == ""
+        entry = json.loads(out.getvalue().splitlines()[-1])
+        assert entry["logger"] == "uvicorn.access"
+        assert entry["request_id"] == "req-2"
+
+    def test_formatter_omits_missing_context(self):
+        record = logging.LogRecord("app", logging.WARNING, __file__, 1, "hello %s", ("world",), None)
+        entry = json.loads(JsonFormatter().format(record))
+        assert entry["message"] == "hello world"
+        assert "request_id" not in entry and "trace_id" not in entry
+
+
+class TestTracing:
+    def test_sampled_request_records_route_db_and_cache_spans(self, exporter):
+        response = make_client().get("/items/7")
+        assert response.status_code == 200
+
+        [spans] = exporter.traces
+        names = [span.name for span in spans]
+        assert names[-1] == "GET /items/{item_id}"
+        assert "cache.get" in names and "db.query" in names
+
+        root = spans[-1]
+        assert root.attributes["http.status_code"] == 200
+        assert all(span.trace_id == root.trace_id for span in spans)
+        assert all(span.parent_id == root.span_id for span in spans[:-1])
+
+    def test_unsampled_request_records_nothing(self, exporter, monkeypatch):
+        monkeypatch.setattr(tracer, "sample_rate", 0.0)
+        make_client().get("/items/7")
+        assert exporter.traces == []
+
+    def test_file_exporter_writes_otlp_json(self, tmp_path):
+        path = tmp_path / "traces.jsonl"
+        file_exporter = FileExporter(str(path), service_name="test")
+        root = Span("a" * 32, None, "GET /orders/", 2, {"http.status_code": 200}, [])
+        root.end = root.start + 1000
+        file_exporter.export([root])
+
+        deadline = time.time() + 2
+        while not path.exists() or not path.read_text():
+            assert time.time() < deadline
+            time.sleep(0.01)
+
+        resource_spans = json.loads(path.read_text().splitlines()[0])["resourceSpans"][0]
+        assert resource_spans["resource"]["attributes"][0]["value"] == {"stringValue": "test"}
+        [span] = resource_spans["scopeSpans"][0]["spans"]
+        assert span["name"] == "GET /orders/"
+        assert span["attributes"] == [{"key": "http.status_code", "value": {"intValue": "200"}}]
+        assert "parentSpanId" not in span
@@ -1,9 +1,13 @@
 import pytest
 from app.tests.setup import client, test_db
+from functools import partial
 from unittest.mock import MagicMock, patch
-from sqlalchemy.orm import Session
+from sqlalchemy import create_engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, sessionmaker
 
-from app.models import Product, Order, OrderProduct
+from app.cache import TableVersions
+from app.models import Product, Order, OrderProduct, TableVersion
 from app.views.orders import (
     get_products_by_ids,
     create_order_record,
@@ -11,10 +15,13 @@ from app.views.orders import (
     validate_product_stock,
     finalize_order,
     format_order_response,
-    create_order
+    format_order_line,
+    create_order,
+    create_orders_batch
 )
 from app import schemas
 from app import exception
+from app.batching import GroupCommitter
 
 
 class TestOrderAPI:
@@ -102,6 +109,112 @@ class TestOrderAPI:
 
         assert response.status_code == 422  # Validation error
 
+    def test_get_order_expanded_uses_price_snapshot(self, client, test_db):
+        """Test expanded orders keep the price and name from order time"""
+        product = Product(name="Lamp", description="Description", price=10.0, stock=10)
+        test_db.add(product)
+        test_db.commit()
+        test_db.refresh(product)
+
+        order_id = client.post(
+            "/orders/", json={"products": [{"product_id": product.id, "quantity": 3}]}
+        ).json()["id"]
+
+        product.price = 99.0
+        product.name = "Renamed lamp"
+        test_db.commit()
+
+        data = client.get(f"/orders/{order_id}?expand=products").json()
+        assert data["products"] == [{
+            "product_id": product.id, "quantity": 3,
+            "product_name": "Lamp", "unit_price": 10.0, "line_total": 30.0
+        }]
+
+        # The plain representation is unchanged
+        data = client.get(f"/orders/{order_id}").json()
+        assert data["products"] == [{"product_id": product.id, "quantity": 3}]
+
+        data = client.get("/orders/?expand=products").json()
+        assert data[-1]["products"][0]["product_name"] == "Lamp"
+
+    def test_etag_follows_writes_from_other_processes(self, test_db):
+        """Test the ETag comes from the shared table_versions rows, not only this process's counters"""
+        versions = TableVersions(check_seconds=0)
+        etag = versions.etag(test_db, "orders")
+
+        # Another process (e.g. python -m app.archive) has its own in-memory counters
+        TableVersions().bump("orders", db=test_db)
+        test_db.commit()
+
+        assert versions.etag(test_db, "orders") != etag
+        assert versions.versions == {}
+
+    def test_version_rows_are_bumped_after_commit(self, test_db):
+        """Test the write transaction never touches table_versions, so checkouts don't queue on its rows"""
+        other = sessionmaker(bind=test_db.get_bind())()
+        versions = TableVersions(check_seconds=0)
+        before = versions.load(other, ["orders"])["orders"][0]
+
+        versions.bump("orders", db=test_db)
+        test_db.rollback()
+        assert versions.load(other, ["orders"])["orders"][0] == before
+
+        versions.bump("orders", db=test_db)
+        assert versions.load(other, ["orders"])["orders"][0] == before
+        test_db.commit()
+        assert versions.load(other, ["orders"])["orders"][0] == before + 1
+        other.close()
+
+    def test_version_bump_needs_no_second_connection(self, test_db):
+        """Test the bump runs once the write's connection is back in the pool, a pool of one is enough"""
+        engine = create_engine(test_db.get_bind().url, pool_size=1, max_overflow=0, pool_timeout=1)
+        versions = TableVersions(check_seconds=0)
+        before = versions.load(test_db, ["orders"])["orders"][0]
+
+        with Session(engine) as db:
+            versions.bump("orders", db=db)
+            db.add(Product(name="Pooled", description="", price=1.0, stock=1))
+            db.commit()
+
+        assert versions.load(test_db, ["orders"])["orders"][0] == before + 1
+        engine.dispose()
+
+    def test_missing_version_row_is_inserted(self, test_db):
+        test_db.query(TableVersion).delete()
+        test_db.commit()
+        versions = TableVersions(check_seconds=0)
+        assert versions.last_modified(test_db, "orders") is None
+
+        versions.store(test_db.get_bind(), {"orders"})
+
+        assert versions.load(test_db, ["orders"])["orders"][0] == 1
+        # Every process reports the stored bump time
+        assert TableVersions().last_modified(test_db, "orders") == versions.last_modified(test_db, "orders")
+
+    def test_get_order_unknown_expand(self, client):
+        """Test only known expansions are accepted"""
+        response = client.get("/orders/1?expand=customers")
+
+        assert response.status_code == 422
+
+    def test_get_orders_conditional_get(self, client, test_db):
+        """Test an unchanged order list returns 304 without hitting the DB and a new order changes the ETag"""
+        product = Product(name="Product", description="Description", price=10.0, stock=10)
+        test_db.add(product)
+        test_db.commit()
+        test_db.refresh(product)
+
+        etag = client.get("/orders/").headers["etag"]
+        with patch('app.views.orders.list_orders') as mock_list_orders:
+            response = client.get("/orders/", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        mock_list_orders.assert_not_called()
+
+        client.post("/orders/", json={"products": [{"product_id": product.id, "quantity": 1}]})
+        response = client.get("/orders/", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert len(response.json()) == 1
+
 
 class TestGetProductsByIds:
     def test_returns_products_map_when_all_products_exist(self):
@@ -188,8 +301,8 @@ class TestProcessOrderItems:
             schemas.OrderProductItem(product_id=2, quantity=3)
         ]
         products_map = {
-            1: MagicMock(spec=Product, id=1, price=10.0, stock=5),
-            2: MagicMock(spec=Product, id=2, price=15.0, stock=10)
+            1: MagicMock(spec=Product, id=1, price=10.0, stock=5, stock_buckets=0),
+            2: MagicMock(spec=Product, id=2, price=15.0, stock=10, stock_buckets=0)
         }
         mock_db = MagicMock(spec=Session)
 
@@ -244,6 +357,36 @@ class TestFormatOrderResponse:
         assert result.products[0].product_id == 1
         assert result.products[0].quantity == 2
 
+    def test_formats_expanded_order_from_snapshot(self):
+
+        mock_order_product = MagicMock(spec=OrderProduct, product_id=1, quantity=2,
+                                       unit_price=5.0, product_name="Pen")
+        mock_order = MagicMock(spec=Order, id=1, total_price=10.0, status="pending",
+                               order_products=[mock_order_product])
+
+
+        result = format_order_response(mock_order, expand=True)
+
+
+        assert isinstance(result, schemas.OrderExpanded)
+        assert result.products[0].product_name == "Pen"
+        assert result.products[0].line_total == 10.0
+
+    def test_expanded_line_without_snapshot_uses_current_product(self):
+
+        product = MagicMock(spec=Product, price=7.0)
+        product.name = "Legacy"
+        mock_order_product = MagicMock(spec=OrderProduct, product_id=1, quantity=2,
+                                       unit_price=None, product_name=None, product=product)
+
+
+        result = format_order_line(mock_order_product)
+
+
+        assert result.unit_price == 7.0
+        assert result.product_name == "Legacy"
+        assert result.line_total == 14.0
+
 
 class TestCreateOrder:
     @patch('app.views.orders.get_products_by_ids')
@@ -296,3 +439,94 @@ class TestCreateOrder:
         
         with pytest.raises(exception.ProductNotFoundError):
             create_order(order, mock_db)
+
+
+class TestCreateOrdersBatch:
+    def make_products(self, test_db, *stocks):
+        products = [
+            Product(name=f"Product {i}", description="Description", price=10.0, stock=stock)
+            for i, stock in enumerate(stocks)
+        ]
+        test_db.add_all(products)
+        test_db.commit()
+        return [p.id for p in products]
+
+    def test_places_all_orders_in_one_commit(self, test_db):
+        p1, p2 = self.make_products(test_db, 10, 10)
+        orders = [
+            schemas.OrderCreate(products=[schemas.OrderProductItem(product_id=p1, quantity=2)]),
+            schemas.OrderCreate(products=[schemas.OrderProductItem(product_id=p1, quantity=3),
+                                          schemas.OrderProductItem(product_id=p2, quantity=1)]),
+        ]
+
+        results = create_orders_batch(orders, session_factory=sessionmaker(bind=test_db.get_bind()))
+
+        assert [r.total_price for r in results] == [20.0, 40.0]
+        assert results[0].id != results[1].id
+        test_db.expire_all()
+        assert test_db.get(Product, p1).stock == 5
+        assert test_db.get(Product, p2).stock == 9
+        assert test_db.query(OrderProduct).count() == 3
+
+    def test_failed_order_does_not_affect_the_rest(self, test_db):
+        p1, = self.make_products(test_db, 5)
+        orders = [
+            schemas.OrderCreate(products=[schemas.OrderProductItem(product_id=p1, quantity=4)]),
+            # Only 1 left after the first order
+            schemas.OrderCreate(products=[schemas.OrderProductItem(product_id=p1, quantity=2)]),
+            schemas.OrderCreate(products=[schemas.OrderProductItem(product_id=9999, quantity=1)]),
+            schemas.OrderCreate(products=[schemas.OrderProductItem(product_id=p1, quantity=1)]),
+        ]
+
+        results = create_orders_batch(orders, session_factory=sessionmaker(bind=test_db.get_bind()))
+
+        assert isinstance(results[0], schemas.Order)
+        assert isinstance(results[1], exception.InsufficientStockError)
+        assert results[1].available == 1
+        assert isinstance(results[2], exception.ProductNotFoundError)
+        assert isinstance(results[3], schemas.Order)
+        test_db.expire_all()
+        assert test_db.get(Product, p1).stock == 0
+        assert test_db.query(Order).count() == 2
+
+    def test_database_error_only_fails_its_order(self, test_db):
+        p1, p2 = self.make_products(test_db, 10, 10)
+        line = partial(schemas.OrderProductItem, quantity=1)
+        good = schemas.OrderCreate(products=[line(product_id=p1)])
+        # Skips validation, the duplicate line violates the order_products primary key
+        duplicate = schemas.OrderCreate.model_construct(
+            products=[line(product_id=p2), line(product_id=p2)], reservation_id=None
+        )
+
+        results = create_orders_batch(
+            [good, good, duplicate, good], session_factory=sessionmaker(bind=test_db.get_bind())
+        )
+
+        assert [isinstance(r, schemas.Order) for r in results] == [True, True, False, True]
+        assert isinstance(results[2], SQLAlchemyError)
+        test_db.expire_all()
+        assert test_db.query(Order).count() == 3
+        assert test_db.get(Product, p1).stock == 7
+        assert test_db.get(Product, p2).stock == 10
+
+    def test_duplicate_product_lines_are_rejected(self, client):
+        response = client.post("/orders/", json={"products": [
+            {"product_id": 1, "quantity": 1}, {"product_id": 1, "quantity": 2}
+        ]})
+
+        assert response.status_code == 422
+
+    def test_create_order_uses_batcher_when_enabled(self, client, test_db):
+        p1, = self.make_products(test_db, 5)
+        batcher = GroupCommitter(
+            partial(create_orders_batch, session_factory=sessionmaker(bind=test_db.get_bind())), window=0.001
+        )
+
+        with patch('app.views.orders.order_batcher', batcher):
+            ok = client.post("/orders/", json={"products": [{"product_id": p1, "quantity": 5}]})
+            rejected = client.post("/orders/", json={"products": [{"product_id": p1, "quantity": 1}]})
+
+        assert ok.status_code == 201
+        assert ok.json()["total_price"] == 50.0
+        assert rejected.status_code == 400
+        assert "Insufficient stock" in rejected.json()["detail"]
@@ -1,3 +1,6 @@
+from unittest.mock import patch
+
+from app.cache import product_cache
 from app.models import Product
 from app.tests.setup import client, test_db
 
@@ -59,3 +62,79 @@ def test_get_nonexistent_product(client):
     response = client.get("/products/9999")
     assert response.status_code == 404
     assert "not found" in response.json()["detail"]
+
+
+def test_get_products_conditional_get(client, test_db):
+    """Test an unchanged product list returns 304 and a new product changes the ETag"""
+    response = client.get("/products/")
+    etag = response.headers["etag"]
+    assert "last-modified" in response.headers
+
+    response = client.get("/products/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    client.post("/products/", json={"name": "New", "description": "New", "price": 1.0, "stock": 1})
+    response = client.get("/products/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert len(response.json()) == 1
+
+
+def add_products(test_db, count):
+    product_cache.invalidate()
+    products = [Product(name=f"Product {i}", description="Description", price=10.0, stock=10) for i in range(count)]
+    test_db.add_all(products)
+    test_db.commit()
+    return [p.id for p in products]
+
+
+def test_get_products_batch(client, test_db):
+    """Test batch lookup keeps the requested order and reports missing ids"""
+    p1, p2, p3 = add_products(test_db, 3)
+
+    response = client.get(f"/products/batch?ids={p3},9999,{p1},{p3}")
+    assert response.status_code == 200
+    data = response.json()
+    assert [p["id"] for p in data["products"]] == [p3, p1]
+    assert data["missing"] == [9999]
+
+
+def test_post_products_batch(client, test_db):
+    """Test the POST form of the batch lookup"""
+    p1, p2 = add_products(test_db, 2)
+
+    response = client.post("/products/batch", json={"ids": [p2, p1]})
+    assert response.status_code == 200
+    assert [p["id"] for p in response.json()["products"]] == [p2, p1]
+
+    assert client.post("/products/batch", json={"ids": []}).status_code == 422
+
+
+def test_get_products_batch_rejects_bad_ids(client):
+    """Test malformed id lists are rejected"""
+    assert client.get("/products/batch?ids=1,abc").status_code == 422
+    assert client.get("/products/batch").status_code == 422
+
+
+def test_products_batch_fetches_only_cache_misses(client, test_db):
+    """Test cached products are served without querying and only misses are fetched"""
+    p1, p2 = add_products(test_db, 2)
+    client.get(f"/products/batch?ids={p1}")
+
+    with patch("app.views.products.fetch_products_by_ids", return_value={}) as mock_fetch:
+        data = client.get(f"/products/batch?ids={p1},{p2}").json()
+
+    mock_fetch.assert_called_once()
+    assert mock_fetch.call_args.args[1] == [p2]
+    assert [p["id"] for p in data["products"]] == [p1]
+
+
+def test_order_invalidates_cached_product(client, test_db):
+    """Test stock changes made by an order are visible through the batch lookup"""
+    p1, = add_products(test_db, 1)
+    client.get(f"/products/batch?ids={p1}")
+
+    client.post("/orders/", json={"products": [{"product_id": p1, "quantity": 4}]})
+
+    assert client.get(f"/products/batch?ids={p1}").json()["products"][0]["stock"] == 6
@@ -0,0 +1,171 @@
+import asyncio
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.ratelimit import ConcurrencyLimiter, InMemoryBackend, RateLimitMiddleware, RedisBackend
+
+
+def make_client(**limits):
+    app = FastAPI()
+
+    @app.get("/orders/")
+    def list_orders():
+        return []
+
+    @app.get("/health")
+    def health():
+        return {"status": "healthy"}
+
+    return TestClient(RateLimitMiddleware(app, **limits))
+
+
+class TestInMemoryBackend:
+    def test_allows_burst_then_limits(self):
+        backend = InMemoryBackend(rate=1, burst=3)
+
+        assert [backend.take("client") for _ in range(3)] == [0.0, 0.0, 0.0]
+        assert backend.take("client") > 0
+        # Other clients have their own bucket
+        assert backend.take("other") == 0.0
+
+    def test_refills_over_time(self):
+        backend = InMemoryBackend(rate=1000, burst=1)
+        backend.take("client")
+        time.sleep(0.002)
+
+        assert backend.take("client") == 0.0
+
+    def test_prunes_refilled_buckets(self):
+        backend = InMemoryBackend(rate=1000, burst=1, max_keys=2)
+        backend.take("a")
+        backend.take("b")
+        time.sleep(0.002)
+        backend.take("c")
+
+        assert set(backend.buckets) == {"c"}
+
+    def test_evicts_least_recently_used_when_nothing_refilled(self):
+        backend = InMemoryBackend(rate=0.001, burst=1, max_keys=10)
+        for i in range(10):
+            backend.take(i)
+        backend.take(0)
+        backend.take("new")
+
+        assert len(backend.buckets) == 10
+        assert 0 in backend.buckets and 1 not in backend.buckets
+
+    def test_stays_bounded_under_a_stream_of_new_keys(self):
+        # Throughput of this path is measured by benchmarks.ratelimit
+        backend = InMemoryBackend(rate=0.001, burst=1, max_keys=1000)
+        for i in range(5000):
+            backend.take(i)
+
+        assert len(backend.buckets) <= 1000
+        assert 4999 in backend.buckets
+
+
+class FakeRedis:
+    def __init__(self, script):
+        self.script = script
+
+    def register_script(self, source):
+        return self.script
+
+
+class TestRedisBackend:
+    def test_uses_redis_result(self):
+        async def script(keys, args):
+            assert keys == ["ratelimit:client"]
+            return b"1.5"
+
+        backend = RedisBackend(None, rate=1, burst=1, client=FakeRedis(script))
+        assert asyncio.run(backend.take("client")) == 1.5
+
+    def test_falls_back_to_local_buckets_when_redis_fails(self):
+        async def down(keys, args):
+            raise ConnectionError("redis is down")
+
+        async def slow(keys, args):
+            await asyncio.sleep(1)
+
+        for script in (down, slow):
+            backend = RedisBackend(None, rate=1, burst=2, timeout=0.01, client=FakeRedis(script))
+            assert [asyncio.run(backend.take("client")) for _ in range(2)] == [0.0, 0.0]
+            assert asyncio.run(backend.take("client")) > 0
+            assert backend.failing
+
+
+class TestAdmission:
+    def test_priority_route_can_use_reserved_slots(self):
+        middleware = RateLimitMiddleware(None, max_in_flight=3, priority_reserved=1)
+
+        assert middleware.admit(("GET", "/products/1")) is not None
+        assert middleware.admit(("GET", "/products/1")) is not None
+        # Only the reserved slot is left
+        assert middleware.admit(("GET", "/products/1")) is None
+        assert middleware.admit(("POST", "/orders/")) is not None
+        assert middleware.admit(("POST", "/orders/")) is None
+
+    def test_list_route_limit_releases_global_slot_on_rejection(self):
+        middleware = RateLimitMiddleware(None, max_in_flight=10, list_route_concurrency=1)
+
+        assert middleware.admit(("GET", "/orders/")) is not None
+        assert middleware.admit(("GET", "/orders/")) is None
+        assert middleware.in_flight.active == 1
+
+    def test_limiter_release(self):
+        limiter = ConcurrencyLimiter(1)
+
+        assert limiter.try_acquire()
+        assert not limiter.try_acquire()
+        limiter.release()
+        assert limiter.try_acquire()
+
+
+class TestRateLimitMiddleware:
+    def test_returns_429_with_retry_after(self):
+        client = make_client(rate=0.5, burst=2)
+
+        assert client.get("/orders/").status_code == 200
+        assert client.get("/orders/").status_code == 200
+        response = client.get("/orders/")
+
+        assert response.status_code == 429
+        assert response.headers["retry-after"] == "2"
+        assert response.json() == {"detail": "Rate limit exceeded"}
+
+    def test_limits_per_api_key(self):
+        client = make_client(rate=0.5, burst=1, api_keys={"a", "b"})
+
+        assert client.get("/orders/", headers={"X-API-Key": "a"}).status_code == 200
+        assert client.get("/orders/", headers={"X-API-Key": "a"}).status_code == 429
+        assert client.get("/orders/", headers={"X-API-Key": "b"}).status_code == 200
+
+    def test_unknown_api_keys_share_the_client_ip_bucket(self):
+        client = make_client(rate=0.5, burst=1, api_keys={"a"})
+
+        assert client.get("/orders/", headers={"X-API-Key": "random-1"}).status_code == 200
+        assert client.get("/orders/", headers={"X-API-Key": "random-2"}).status_code == 429
+        assert client.get("/orders/", headers={"X-API-Key": "a"}).status_code == 200
+
+    def test_health_is_never_limited(self):
+        client = make_client(rate=0.5, burst=1)
+
+        assert all(client.get("/health").status_code == 200 for _ in range(5))
+
+    def test_sheds_with_503_when_route_is_full(self):
+        client = make_client(list_route_concurrency=1)
+        client.app.route_limiters[("GET", "/orders/")].active = 1
+
+        response = client.get("/orders/")
+
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
+
+    def test_disabled_by_default(self):
+        middleware = RateLimitMiddleware(None, rate=0, max_in_flight=0, list_route_concurrency=0)
+
+        assert middleware.backend is None
+        assert middleware.admit(("GET", "/orders/")) == []
@@ -0,0 +1,200 @@
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+
+from app import exception, schemas
+from app.cache import product_cache
+from app.models import Product
+from app.replicas import ReplicaSet, RoutingSession, StickyWindow
+from app.settings import production
+from app.settings.production import Base, get_db, sticky_writes
+from app.views import orders
+from app.views.orders import create_order
+
+
+@pytest.fixture
+def routed_sessions(tmp_path):
+    """Primary and replica as two SQLite files, seeded with different rows so reads show their source"""
+    primary = create_engine(f"sqlite:///{tmp_path}/primary.db")
+    replica = create_engine(f"sqlite:///{tmp_path}/replica.db")
+    for engine, name in ((primary, "from primary"), (replica, "from replica")):
+        Base.metadata.create_all(bind=engine)
+        with sessionmaker(bind=engine)() as db:
+            db.add(Product(id=1, name=name, description="", price=1.0, stock=1))
+            db.commit()
+
+    replicas = ReplicaSet([replica], check_interval=60)
+    sticky = StickyWindow(seconds=60)
+    factory = sessionmaker(class_=RoutingSession, bind=primary, replicas=replicas, sticky=sticky)
+    return factory, replicas, sticky
+
+
+def product_name(db):
+    return db.query(Product).filter(Product.id == 1).one().name
+
+
+class TestRoutingSession:
+    def test_reads_go_to_replica(self, routed_sessions):
+        factory, _, _ = routed_sessions
+
+        with factory() as db:
+            assert product_name(db) == "from replica"
+
+    def test_writes_go_to_primary_and_pin_later_reads(self, routed_sessions):
+        factory, _, sticky = routed_sessions
+
+        with factory() as db:
+            db.client_key = "client-1"
+            db.add(Product(id=2, name="new", description="", price=1.0, stock=1))
+            db.commit()
+
+            assert db.use_primary is True
+            assert product_name(db) == "from primary"
+            assert db.query(Product).filter(Product.id == 2).one().name == "new"
+
+        assert sticky.active("client-1")
+        assert not sticky.active("client-2")
+
+    def test_use_primary_forces_primary_read(self, routed_sessions):
+        factory, _, _ = routed_sessions
+
+        with factory() as db:
+            db.use_primary = True
+            assert product_name(db) == "from primary"
+
+    def test_falls_back_to_primary_when_replica_unhealthy(self, routed_sessions, tmp_path):
+        factory, _, _ = routed_sessions
+        broken = create_engine(f"sqlite:///{tmp_path}/missing/dir/replica.db")
+        replicas = ReplicaSet([broken], check_interval=60)
+
+        with factory(replicas=replicas) as db:
+            assert product_name(db) == "from primary"
+
+        assert replicas.is_healthy(broken) is False
+
+    def test_replica_failing_between_checks_falls_back_to_primary(self, routed_sessions, tmp_path):
+        factory, _, _ = routed_sessions
+        broken = create_engine(f"sqlite:///{tmp_path}/missing/dir/replica.db")
+        replicas = ReplicaSet([broken], check_interval=60)
+        # Healthy at its last check, it went away since
+        replicas._checked_at[id(broken)] = time.monotonic()
+
+        with factory(replicas=replicas) as db:
+            assert product_name(db) == "from primary"
+            assert db.use_primary is True
+
+        assert replicas.is_healthy(broken) is False
+
+    def test_without_replicas_everything_uses_primary(self, routed_sessions):
+        factory, _, _ = routed_sessions
+
+        with factory(replicas=None) as db:
+            assert product_name(db) == "from primary"
+
+
+class TestStickyWindow:
+    def test_expires(self):
+        sticky = StickyWindow(seconds=0.0001)
+        sticky.mark("client")
+        time.sleep(0.001)
+
+        assert not sticky.active("client")
+
+    def test_forgets_oldest_clients_past_max_keys(self):
+        sticky = StickyWindow(seconds=60, max_keys=3)
+        for i in range(10):
+            sticky.mark(f"client-{i}")
+
+        assert len(sticky._writes) == 3
+        assert sticky.active("client-9")
+        assert not sticky.active("client-0")
+
+
+def make_request(headers=None, method="GET"):
+    raw_headers = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    return Request({"type": "http", "method": method, "headers": raw_headers, "client": ("10.0.0.1", 1234)})
+
+
+class TestGetDb:
+    def test_read_primary_header_forces_primary(self):
+        gen = get_db(make_request({"X-Read-Primary": "1"}))
+        db = next(gen)
+        try:
+            assert db.use_primary is True
+        finally:
+            gen.close()
+
+    def test_remote_address_is_not_a_client_key(self):
+        # A load balancer's address is shared by every client behind it
+        gen = get_db(make_request())
+        db = next(gen)
+        try:
+            assert db.client_key is None
+        finally:
+            gen.close()
+
+    def test_recent_write_by_client_forces_primary(self):
+        sticky_writes.mark("checkout-42")
+        gen = get_db(make_request({"X-Client-Id": "checkout-42"}))
+        db = next(gen)
+        try:
+            assert db.use_primary is True
+        finally:
+            gen.close()
+
+    def test_other_clients_read_from_replicas(self):
+        gen = get_db(make_request({"X-Client-Id": "someone-else"}))
+        db = next(gen)
+        try:
+            assert db.use_primary is False
+        finally:
+            gen.close()
+
+    def test_write_requests_read_from_primary(self):
+        gen = get_db(make_request({"X-Client-Id": "someone-else"}, method="POST"))
+        db = next(gen)
+        try:
+            assert db.use_primary is True
+        finally:
+            gen.close()
+
+    def test_order_checks_stock_on_primary_not_lagging_replica(self, routed_sessions, monkeypatch):
+        factory, replicas, _ = routed_sessions
+        # The replica still shows stock the primary no longer has
+        for engine, stock in ((factory.kw["bind"], 2), (replicas.engines[0], 10)):
+            with sessionmaker(bind=engine)() as db:
+                db.query(Product).filter(Product.id == 1).update({"stock": stock})
+                db.commit()
+        product_cache.invalidate()
+        monkeypatch.setattr(production, "SessionLocal", factory)
+
+        gen = get_db(make_request({"X-Client-Id": "fresh-client"}, method="POST"))
+        db = next(gen)
+        try:
+            order = schemas.OrderCreate(products=[schemas.OrderProductItem(product_id=1, quantity=5)])
+            with pytest.raises(exception.InsufficientStockError):
+                create_order(order, db)
+        finally:
+            gen.close()
+
+        with factory() as db:
+            db.use_primary = True
+            assert db.query(Product).filter(Product.id == 1).one().stock == 2
+
+    def test_batched_order_pins_client_to_primary(self, routed_sessions, monkeypatch):
+        factory, _, sticky = routed_sessions
+        batcher = MagicMock()
+        monkeypatch.setattr(orders, "order_batcher", batcher)
+
+        db = factory()
+        db.client_key = "batched-client"
+        order = schemas.OrderCreate(products=[schemas.OrderProductItem(product_id=1, quantity=1)])
+
+        assert create_order(order, db) is batcher.submit.return_value
+        assert db.use_primary is True
+        assert sticky.active("batched-client")
+        db.close()
@@ -0,0 +1,126 @@
+from datetime import timedelta
+
+from app.inventory import enable_striping
+from app.models import Product, Reservation, ReservationItem, ProductStockBucket
+from app.reservations import release_expired_reservations, utcnow
+from app.tests.setup import client, test_db
+
+
+def add_product(test_db, stock=10):
+    product = Product(name="Product", description="Description", price=10.0, stock=stock)
+    test_db.add(product)
+    test_db.commit()
+    test_db.refresh(product)
+    return product
+
+
+def reserve(client, product_id, quantity, **extra):
+    return client.post("/reservations", json={"products": [{"product_id": product_id, "quantity": quantity}], **extra})
+
+
+def expire_all_reservations(test_db):
+    test_db.query(Reservation).update({"expires_at": utcnow() - timedelta(seconds=1)})
+    test_db.commit()
+
+
+class TestReservationAPI:
+    def test_reservation_holds_stock(self, client, test_db):
+        product = add_product(test_db)
+
+        response = reserve(client, product.id, 3, ttl_seconds=60)
+
+        assert response.status_code == 201
+        assert response.json()["products"] == [{"product_id": product.id, "quantity": 3}]
+        data = client.get(f"/products/{product.id}").json()
+        assert data["available"] == 7
+        assert data["held"] == 3
+
+    def test_reservation_with_insufficient_stock(self, client, test_db):
+        product = add_product(test_db, stock=2)
+
+        response = reserve(client, product.id, 3)
+
+        assert response.status_code == 400
+        test_db.refresh(product)
+        assert product.stock == 2
+
+    def test_order_consumes_reservation(self, client, test_db):
+        product = add_product(test_db, stock=3)
+        reservation_id = reserve(client, product.id, 3).json()["id"]
+
+        response = client.post("/orders/", json={"reservation_id": reservation_id})
+
+        assert response.status_code == 201
+        assert response.json()["total_price"] == 30.0
+        assert response.json()["products"] == [{"product_id": product.id, "quantity": 3}]
+        test_db.refresh(product)
+        assert product.stock == 0
+        data = client.get(f"/products/{product.id}").json()
+        assert data["held"] == 0
+
+        # A reservation can only be used once
+        assert client.post("/orders/", json={"reservation_id": reservation_id}).status_code == 404
+
+    def test_expired_reservation_cannot_be_ordered(self, client, test_db):
+        product = add_product(test_db)
+        reservation_id = reserve(client, product.id, 3).json()["id"]
+        expire_all_reservations(test_db)
+
+        response = client.post("/orders/", json={"reservation_id": reservation_id})
+
+        assert response.status_code == 404
+        assert "expired" in response.json()["detail"]
+
+    def test_order_needs_products_or_reservation(self, client):
+        assert client.post("/orders/", json={}).status_code == 422
+        assert client.post("/orders/", json={
+            "reservation_id": 1, "products": [{"product_id": 1, "quantity": 1}]
+        }).status_code == 422
+
+    def test_ttl_is_bounded(self, client, test_db):
+        product = add_product(test_db)
+
+        assert reserve(client, product.id, 1, ttl_seconds=0).status_code == 422
+        assert reserve(client, product.id, 1, ttl_seconds=10 ** 6).status_code == 422
+
+
+class TestReleaseExpiredReservations:
+    def test_releases_expired_holds_in_bulk(self, client, test_db):
+        product = add_product(test_db)
+        reserve(client, product.id, 2)
+        reserve(client, product.id, 3)
+        live_id = reserve(client, product.id, 1).json()["id"]
+        test_db.query(Reservation).filter(Reservation.id != live_id).update(
+            {"expires_at": utcnow() - timedelta(seconds=1)})
+        test_db.commit()
+
+        assert release_expired_reservations(test_db) == 2
+
+        test_db.refresh(product)
+        assert product.stock == 9
+        assert [r.id for r in test_db.query(Reservation)] == [live_id]
+        assert test_db.query(ReservationItem).count() == 1
+
+    def test_releases_in_batches(self, client, test_db):
+        product = add_product(test_db)
+        for _ in range(3):
+            reserve(client, product.id, 1)
+        expire_all_reservations(test_db)
+
+        assert release_expired_reservations(test_db, limit=2) == 2
+        assert release_expired_reservations(test_db, limit=2) == 1
+        assert release_expired_reservations(test_db, limit=2) == 0
+
+        test_db.refresh(product)
+        assert product.stock == 10
+
+    def test_releases_striped_stock_into_a_bucket(self, client, test_db):
+        product = add_product(test_db)
+        enable_striping(test_db, product.id, 2)
+        reserve(client, product.id, 4)
+        expire_all_reservations(test_db)
+
+        release_expired_reservations(test_db)
+
+        test_db.expire_all()
+        assert sum(b.stock for b in test_db.query(ProductStockBucket)) == 10
@@ -0,0 +1,138 @@
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+
+from app.cache import TableVersions, order_cache, product_cache
+from app.main import app
+from app.response_cache import ResponseCacheMiddleware, normalized_query
+from app.tests.setup import client, test_db
+
+
+def make_client(**options):
+    calls = []
+    versions = TableVersions()
+    demo = FastAPI()
+
+    @demo.get("/products/")
+    def list_products(response: Response, page: int = 1, size: int = 10):
+        calls.append((page, size))
+        response.headers["ETag"] = '"v1"'
+        return [{"id": i} for i in range(size)]
+
+    @demo.get("/products/private")
+    def private(response: Response):
+        calls.append("private")
+        response.headers["Cache-Control"] = "private"
+        return {}
+
+    @demo.get("/health")
+    def health():
+        calls.append("health")
+        return {"status": "healthy"}
+
+    middleware = ResponseCacheMiddleware(demo, versions=versions, **options)
+    return TestClient(middleware), calls, versions, middleware
+
+
+class TestResponseCache:
+    def test_replays_bytes_without_calling_the_app(self):
+        client, calls, _, _ = make_client()
+        first = client.get("/products/?size=3&page=2")
+        second = client.get("/products/?page=2&size=3")
+
+        assert first.headers["X-Cache"] == "MISS"
+        assert second.headers["X-Cache"] == "HIT"
+        assert second.content == first.content
+        assert second.headers["ETag"] == '"v1"'
+        assert calls == [(2, 3)]
+
+    def test_write_tag_invalidates(self):
+        client, calls, versions, _ = make_client()
+        client.get("/products/")
+        versions.bump("orders")
+        assert client.get("/products/").headers["X-Cache"] == "HIT"
+
+        versions.bump("products")
+        assert client.get("/products/").headers["X-Cache"] == "MISS"
+        assert len(calls) == 2
+
+    def test_keyed_by_encoding(self):
+        client, calls, _, _ = make_client()
+        client.get("/products/", headers={"Accept-Encoding": "gzip"})
+        client.get("/products/", headers={"Accept-Encoding": "gzip, deflate"})
+        client.get("/products/", headers={"Accept-Encoding": "identity"})
+        assert len(calls) == 2
+
+    def test_bypassed_and_uncacheable_requests(self):
+        client, calls, _, _ = make_client()
+        for _ in range(2):
+            client.get("/products/", headers={"Authorization": "Bearer token"})
+            client.get("/products/", headers={"X-Read-Primary": "true"})
+            client.get("/products/private")
+            client.get("/health")
+        assert len(calls) == 8
+
+    def test_if_none_match_on_hit_returns_304(self):
+        client, _, _, _ = make_client()
+        client.get("/products/")
+        response = client.get("/products/", headers={"If-None-Match": '"v1"'})
+        assert response.status_code == 304
+        assert response.headers["X-Cache"] == "HIT"
+        assert response.content == b""
+
+    def test_ttl_and_max_entries(self):
+        client, calls, _, middleware = make_client(max_entries=2, ttl_seconds=0)
+        client.get("/products/")
+        client.get("/products/")
+        assert len(calls) == 2
+
+        middleware.ttl_seconds = 60
+        for size in (1, 2, 3):
+            client.get(f"/products/?size={size}")
+        assert len(middleware.entries) == 2
+
+    def test_entity_paths_get_entity_tags(self):
+        _, _, _, middleware = make_client()
+        assert middleware.tags_for("/orders/12") == ("order_12",)
+        assert middleware.tags_for("/products/7") == ("product_7",)
+        assert middleware.tags_for("/products/batch") == ("products",)
+        assert middleware.tags_for("/orders/") == ("orders",)
+        assert middleware.tags_for("/health") is None
+
+    def test_normalized_query(self):
+        assert normalized_query(b"b=2&a=1&a=0") == "a=0&a=1&b=2"
+        assert normalized_query(b"") == ""
+
+
+class TestResponseCacheWithApp:
+    def test_order_invalidates_cached_product_list(self, client, test_db):
+        order_cache.invalidate()
+        product_cache.invalidate()
+        cached = TestClient(ResponseCacheMiddleware(app))
+        product_id = client.post(
+            "/products/", json={"name": "Cached", "description": "", "price": 2.0, "stock": 5}
+        ).json()["id"]
+
+        assert cached.get("/products/").headers["X-Cache"] == "MISS"
+        assert cached.get("/products/").headers["X-Cache"] == "HIT"
+
+        cached.post("/orders/", json={"products": [{"product_id": product_id, "quantity": 2}]})
+        response = cached.get("/products/")
+        assert response.headers["X-Cache"] == "MISS"
+        assert next(p for p in response.json() if p["id"] == product_id)["stock"] == 3
+
+    def test_order_only_drops_the_products_it_contains(self, client, test_db):
+        order_cache.invalidate()
+        product_cache.invalidate()
+        cached = TestClient(ResponseCacheMiddleware(app))
+        sold, other = (client.post(
+            "/products/", json={"name": name, "description": "", "price": 2.0, "stock": 5}
+        ).json()["id"] for name in ("Sold", "Other"))
+        order_id = cached.post("/orders/", json={"products": [{"product_id": sold, "quantity": 1}]}).json()["id"]
+        paths = [f"/products/{sold}", f"/products/{other}", f"/orders/{order_id}", "/products/"]
+        for path in paths:
+            cached.get(path)
+
+        cached.post("/orders/", json={"products": [{"product_id": sold, "quantity": 1}]})
+
+        assert [cached.get(path).headers["X-Cache"] for path in paths] == ["MISS", "HIT", "HIT", "MISS"]
+        assert cached.get(f"/products/{sold}").json()["stock"] == 3
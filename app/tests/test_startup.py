@@ -0,0 +1,104 @@
+import asyncio
+import os
+import re
+import subprocess
+import sys
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from sqlalchemy import create_engine, inspect, text
+from fastapi.testclient import TestClient
+
+from app import startup
+from app.main import app
+
+# Budget for importing the app's own modules on a fresh worker, on top of the framework imports
+# (measured at ~150ms). Override on slow CI machines
+IMPORT_TIME_BUDGET_MS = int(os.getenv("IMPORT_TIME_BUDGET_MS", "300"))
+# Imported by every app anyway, preloaded so the measurement only covers what this repo adds
+FRAMEWORK_IMPORTS = "import fastapi, fastapi.middleware.cors, pydantic, sqlalchemy.orm, starlette.requests"
+# Opt-in subsystems that must stay off the import path while disabled
+LAZY_MODULES = ("brotli", "app.warming", "app.trace_export", "uvicorn")
+
+
+def make_engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path}/startup.db", connect_args={"check_same_thread": False})
+
+
+class TestPrepareSchema:
+    def test_creates_tables_when_not_migrated(self, tmp_path):
+        engine = make_engine(tmp_path)
+
+        startup.prepare_schema(bind=engine, mode="auto")
+
+        assert inspect(engine).has_table("products")
+        assert inspect(engine).has_table("orders")
+
+    def test_skips_create_all_when_migrations_applied(self, tmp_path):
+        engine = make_engine(tmp_path)
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)"))
+            conn.execute(text("INSERT INTO alembic_version VALUES ('abc123')"))
+
+        startup.prepare_schema(bind=engine, mode="auto")
+
+        assert startup.migrations_applied(engine)
+        assert not inspect(engine).has_table("products")
+
+    def test_skip_mode_never_touches_the_database(self):
+        mock_engine = MagicMock()
+
+        startup.prepare_schema(bind=mock_engine, mode="skip")
+
+        mock_engine.connect.assert_not_called()
+
+
+class TestWarmUp:
+    def test_warms_pool_and_marks_app_ready(self, tmp_path):
+        engine = make_engine(tmp_path)
+        warmer = MagicMock()
+        state = SimpleNamespace(state=SimpleNamespace(ready=False))
+
+        asyncio.run(startup.warm_up(state, warmers=[warmer], bind=engine))
+
+        warmer.assert_called_once()
+        assert state.state.ready is True
+        assert engine.pool.checkedin() > 0
+
+    def test_failed_warmer_does_not_block_readiness(self, tmp_path):
+        engine = make_engine(tmp_path)
+        state = SimpleNamespace(state=SimpleNamespace(ready=False))
+
+        asyncio.run(startup.warm_up(state, warmers=[MagicMock(side_effect=RuntimeError("boom"))], bind=engine))
+
+        assert state.state.ready is True
+
+
+def test_ready_endpoint_reflects_warm_up_state():
+    client = TestClient(app)
+
+    app.state.ready = False
+    assert client.get("/ready").status_code == 503
+    assert client.get("/health").status_code == 200
+
+    app.state.ready = True
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready"}
+
+
+def test_import_time_within_budget():
+    """Import the app in a fresh interpreter and check the -X importtime total of app.main"""
+    env = {k: v for k, v in os.environ.items() if k not in ("CACHE_HOT_KEYS_PATH", "TRACE_EXPORT_PATH")}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"{FRAMEWORK_IMPORTS}; import app.main"],
+        capture_output=True, text=True, check=True, env=env,
+        cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    )
+    match = re.search(r"import time:\s+\d+ \|\s+(\d+) \| app\.main$", result.stderr, re.MULTILINE)
+    assert match, "app.main missing from importtime output"
+
+    cumulative_ms = int(match.group(1)) / 1000
+    assert cumulative_ms < IMPORT_TIME_BUDGET_MS, f"Importing app.main took {cumulative_ms:.0f}ms"
+    for module in LAZY_MODULES:
+        assert re.search(rf"\| +{re.escape(module)}$", result.stderr, re.MULTILINE) is None, module
@@ -0,0 +1,151 @@
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.orm import sessionmaker
+
+from app import schemas
+from app.cache import Cache, FrequencySketch, order_cache, product_cache
+from app.models import Product
+from app.tests.setup import client, test_db
+from app.views.orders import create_order
+from app.warming import load_hot_keys, plan_batches, snapshot_hot_keys, warm_hot_keys, load_orders, load_products
+
+
+class TestFrequencySketch:
+    def test_estimates_counts_and_ranks_hot_keys(self):
+        sketch = FrequencySketch(64, top_k=2)
+        for key, count in (("a", 5), ("b", 3), ("c", 1)):
+            for _ in range(count):
+                sketch.increment(key)
+
+        assert sketch.estimate("a") >= 5
+        assert sketch.estimate("missing") <= 1
+        assert sketch.hot_keys(2) == ["a", "b"]
+
+    def test_counts_age(self):
+        sketch = FrequencySketch(16)
+        for _ in range(8):
+            sketch.increment("a")
+        sketch.age()
+        assert sketch.estimate("a") == 4
+        assert sketch.hot_keys() == ["a"]
+
+    def test_concurrent_increments_and_aging(self):
+        # Switch threads as often as possible so aging overlaps tracking in another thread
+        previous = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        sketch = FrequencySketch(64, top_k=1000)
+
+        def hammer(thread):
+            for i in range(20000):
+                sketch.increment(f"key_{thread}_{i % 1000}")
+
+        try:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(hammer, range(8)))
+        finally:
+            sys.setswitchinterval(previous)
+
+        assert sketch.additions < sketch.sample_size
+        assert len(sketch.hot_keys()) <= 2 * sketch.top_k
+
+
+class TestAdmission:
+    def test_scan_does_not_evict_hot_entries(self):
+        cache = Cache(max_size=100)
+        for i in range(100):
+            for _ in range(3):
+                cache.get(f"hot_{i}")
+            cache.set(f"hot_{i}", i)
+
+        # A crawler reading ten times as many keys once each, while regular traffic goes on
+        for i in range(1000):
+            cache.get(f"hot_{i % 100}")
+            if cache.get(f"order_{i}") is None:
+                cache.set(f"order_{i}", i)
+
+        assert len(cache.cache) == 100
+        # The sketch is approximate, a hash collision may still let the odd scanned key in
+        assert sum(cache.get(f"hot_{i}") == i for i in range(100)) >= 90
+
+    def test_frequent_newcomer_replaces_oldest(self):
+        cache = Cache(max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        for _ in range(3):
+            cache.get("c")
+        cache.set("c", 3)
+
+        assert cache.get("a") is None
+        assert cache.get("c") == 3
+
+    def test_unbounded_cache_has_no_sketch(self):
+        cache = Cache()
+        cache.get("a")
+        assert cache.hot_keys() == []
+
+
+class TestWarming:
+    def test_snapshot_round_trip(self, tmp_path):
+        cache = Cache(max_size=16)
+        for _ in range(2):
+            cache.get("product_1")
+        cache.get("product_2")
+        path = str(tmp_path / "hot_keys.json")
+
+        snapshot_hot_keys(path, top_k=10, caches={"product_cache": cache})
+
+        assert load_hot_keys(path) == {"product_cache": ["product_1", "product_2"]}
+        assert load_hot_keys(str(tmp_path / "missing.json")) == {}
+
+    def test_concurrent_snapshots_leave_a_complete_file(self, tmp_path):
+        cache = Cache(max_size=16)
+        cache.get("product_1")
+        path = str(tmp_path / "hot_keys.json")
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda _: snapshot_hot_keys(path, caches={"product_cache": cache}), range(32)))
+
+        assert load_hot_keys(path) == {"product_cache": ["product_1"]}
+        assert os.listdir(tmp_path) == ["hot_keys.json"]
+
+    def test_plan_batches_groups_keys_by_loader(self):
+        batches = plan_batches({
+            "order_cache": ["order_1", "order_2_expanded", "orders_list", "unknown"],
+            "product_cache": ["product_1", "product_2", "product_3", "order_4"],
+        }, batch_size=2)
+
+        assert [(loader, [m.group(0) for m in matches]) for loader, matches in batches
+                if loader in (load_orders, load_products)] == [
+            (load_orders, ["order_1", "order_2_expanded"]),
+            (load_products, ["product_1", "product_2"]),
+            (load_products, ["product_3"]),
+        ]
+        assert len(batches) == 4
+
+    def test_warm_hot_keys_prefetches_snapshot(self, client, test_db, tmp_path):
+        order_cache.invalidate()
+        product_cache.invalidate()
+        product = Product(name="Hot", description="", price=3.0, stock=10)
+        test_db.add(product)
+        test_db.commit()
+        order = create_order(schemas.OrderCreate(products=[
+            schemas.OrderProductItem(product_id=product.id, quantity=1)
+        ]), test_db)
+        order_cache.invalidate()
+        product_cache.invalidate()
+
+        path = tmp_path / "hot_keys.json"
+        path.write_text(json.dumps({"caches": {
+            "order_cache": [f"order_{order.id}_expanded", "order_999999"],
+            "product_cache": [f"product_{product.id}"],
+        }}))
+        factory = sessionmaker(bind=test_db.get_bind())
+
+        assert warm_hot_keys(str(path), session_factory=factory, concurrency=2) == 3
+        assert order_cache.get(f"order_{order.id}").id == order.id
+        assert order_cache.get(f"order_{order.id}_expanded").products[0].product_name == "Hot"
+        assert product_cache.get(f"product_{product.id}").name == "Hot"
+        assert warm_hot_keys("") == 0
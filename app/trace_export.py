@@ -0,0 +1,45 @@
+"""
+Background writer of sampled traces as OTLP/JSON lines, imported by app.tracing
+only when TRACE_EXPORT_PATH is set.
+"""
+import json
+import queue
+import threading
+
+from app.tracing import TRACE_SERVICE_NAME, otlp_attribute
+
+
+class FileExporter:
+    """Writes finished traces from a background thread, dropping them when the queue is full"""
+
+    def __init__(self, path, service_name=TRACE_SERVICE_NAME, max_queue=10_000):
+        self.path = path
+        self.service_name = service_name
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, spans) -> None:
+        try:
+            self.queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        with open(self.path, "a", encoding="utf-8") as out:
+            while True:
+                batch = [self.queue.get()]
+                while not self.queue.empty() and len(batch) < 100:
+                    batch.append(self.queue.get_nowait())
+                out.write(json.dumps(self.to_otlp(batch)) + "\n")
+                out.flush()
+
+    def to_otlp(self, traces) -> dict:
+        return {"resourceSpans": [{
+            "resource": {"attributes": [otlp_attribute("service.name", self.service_name)]},
+            "scopeSpans": [{
+                "scope": {"name": "app.tracing"},
+                "spans": [span.to_otlp() for spans in traces for span in spans],
+            }],
+        }]}
@@ -0,0 +1,149 @@
+"""
+Sampled trace spans exported as OTLP/JSON lines, the format of the OpenTelemetry
+collector's file exporter. The sampling decision is made once per request, so an
+unsampled request only pays for a context variable lookup per span.
+"""
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+# Spans are only recorded when an export path is set
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "ecommerce-api")
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+current_span = ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start", "end", "attributes", "error",
+                 "finished")
+
+    def __init__(self, trace_id, parent_id, name, kind, attributes, finished):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start = time.time_ns()
+        self.end = None
+        self.attributes = attributes
+        self.error = False
+        # Finished spans of the trace, shared by every span in it and exported with the root
+        self.finished = finished
+
+    def set(self, key, value) -> None:
+        self.attributes[key] = value
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start),
+            "endTimeUnixNano": str(self.end),
+            "attributes": [otlp_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": 2 if self.error else 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def otlp_attribute(key, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class Tracer:
+    def __init__(self, exporter=None, sample_rate=TRACE_SAMPLE_RATE):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    @contextmanager
+    def trace(self, name, **attributes):
+        """Root span of a request, sampled at sample_rate"""
+        if self.exporter is None or random.random() >= self.sample_rate:
+            yield None
+            return
+
+        root = Span(f"{random.getrandbits(128):032x}", None, name, SPAN_KIND_SERVER, attributes, [])
+        token = current_span.set(root)
+        try:
+            yield root
+        except BaseException:
+            root.error = True
+            raise
+        finally:
+            current_span.reset(token)
+            root.end = time.time_ns()
+            self.exporter.export(root.finished + [root])
+
+    @contextmanager
+    def span(self, name, kind=SPAN_KIND_INTERNAL, **attributes):
+        """Child span of the current one, a no-op outside a sampled request"""
+        parent = current_span.get()
+        if parent is None:
+            yield None
+            return
+
+        span = self.start_span(parent, name, kind, attributes)
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException:
+            span.error = True
+            raise
+        finally:
+            current_span.reset(token)
+            self.finish_span(span)
+
+    def start_span(self, parent, name, kind=SPAN_KIND_INTERNAL, attributes=None):
+        return Span(parent.trace_id, parent.span_id, name, kind, attributes or {}, parent.finished)
+
+    def finish_span(self, span) -> None:
+        span.end = time.time_ns()
+        span.finished.append(span)
+
+
+def make_exporter():
+    """The file exporter when traces are exported, its module is only imported then"""
+    if not TRACE_EXPORT_PATH or TRACE_SAMPLE_RATE <= 0:
+        return None
+    from app.trace_export import FileExporter
+
+    return FileExporter(TRACE_EXPORT_PATH)
+
+
+tracer = Tracer(make_exporter())
+
+
+def instrument_engine(engine) -> None:
+    """Record a client span for every statement run on engine"""
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        parent = current_span.get()
+        if parent is not None:
+            context._trace_span = tracer.start_span(
+                parent, "db.query", SPAN_KIND_CLIENT, {"db.statement": statement[:500]}
+            )
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        span = getattr(context, "_trace_span", None)
+        if span is not None:
+            tracer.finish_span(span)
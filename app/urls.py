@@ -1,5 +1,5 @@
 from fastapi import APIRouter, status
-from typing import List
+from typing import List, Union
 
 from app import schemas
 from app import views
@@ -9,11 +9,18 @@ router = APIRouter()
 # ------------------ Products Routes ------------------
 
 router.add_api_route("/products/", views.products.get_products, methods=["GET"], response_model=List[schemas.Product])
-router.add_api_route("/products/{product_id}", views.products.get_product, methods=["GET"], response_model=schemas.Product)
+# Registered before /products/{product_id} so "batch" isn't parsed as an id
+router.add_api_route("/products/batch", views.products.get_products_batch, methods=["GET"], response_model=schemas.ProductBatch)
+router.add_api_route("/products/batch", views.products.post_products_batch, methods=["POST"], response_model=schemas.ProductBatch)
+router.add_api_route("/products/{product_id}", views.products.get_product, methods=["GET"], response_model=schemas.ProductDetail)
 router.add_api_route("/products/", views.products.create_product, methods=["POST"], response_model=schemas.Product, status_code=status.HTTP_201_CREATED)
 
 # ------------------ Orders Routes ------------------
 
-router.add_api_route("/orders/", views.orders.get_orders, methods=["GET"], response_model=List[schemas.Order])
-router.add_api_route("/orders/{order_id}", views.orders.get_order, methods=["GET"], response_model=schemas.Order)
+router.add_api_route("/orders/", views.orders.get_orders, methods=["GET"], response_model=List[Union[schemas.OrderExpanded, schemas.Order]])
+router.add_api_route("/orders/{order_id}", views.orders.get_order, methods=["GET"], response_model=Union[schemas.OrderExpanded, schemas.Order])
 router.add_api_route("/orders/", views.orders.create_order, methods=["POST"], response_model=schemas.Order, status_code=status.HTTP_201_CREATED)
+
+# ------------------ Reservations Routes ------------------
+
+router.add_api_route("/reservations", views.reservations.create_reservation, methods=["POST"], response_model=schemas.Reservation, status_code=status.HTTP_201_CREATED)
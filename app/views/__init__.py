@@ -1,2 +1,3 @@
 from . import products
 from . import orders
+from . import reservations
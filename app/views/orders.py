@@ -1,12 +1,26 @@
-from fastapi import Depends
+import logging
+
+from fastapi import Depends, Request, Response
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Literal, Optional
 
 from app import schemas, exception
-from app.settings.production import get_db
-from app.models import Product, Order, OrderProduct
-from sqlalchemy.orm import joinedload
-from app.cache import order_cache
+from app.settings.production import get_db, SessionLocal
+from app.replicas import RoutingSession
+from app.models import Product, Order, OrderProduct, OrderArchive
+from sqlalchemy.orm import selectinload
+from app.cache import order_cache, table_versions, invalidate_products
+from app.conditional import conditional_get
+from app.inventory import take_striped_stock, restore_striped_stock
+from app.reservations import consume_reservation
+from app.archive import get_archived_order
+from app.batching import (
+    GroupCommitter, ORDER_BATCHING_ENABLED, ORDER_BATCH_WINDOW_MS, ORDER_BATCH_MAX_SIZE, ORDER_BATCH_TIMEOUT_SECONDS
+)
+from app.tracing import tracer
+
+logger = logging.getLogger(__name__)
 
 
 def create_order(order: schemas.OrderCreate, db: Session = Depends(get_db)) -> schemas.Order:
@@ -14,6 +28,17 @@ def create_order(order: schemas.OrderCreate, db: Session = Depends(get_db)) -> s
     Create a new order with stock validation.
     # TODO: Move the logic to a service layer - ex: order_service
     """
+    if order.reservation_id is not None:
+        return create_order_from_reservation(order.reservation_id, db)
+
+    if order_batcher is not None:
+        # Share a transaction and commit with other concurrent checkouts
+        result = order_batcher.submit(order)
+        # The batch wrote through its own session, this client's next reads must still go to the primary
+        if isinstance(db, RoutingSession):
+            db.mark_write()
+        return result
+
     # Get products and validate they exist
     product_ids = [item.product_id for item in order.products]
     products_map = get_products_by_ids(db, product_ids)
@@ -24,18 +49,37 @@ def create_order(order: schemas.OrderCreate, db: Session = Depends(get_db)) -> s
     # Process ordered items and calculate total
     total_price, order_products = process_order_items(db_order.id, order.products, products_map, db)
 
+    # Stock changed too, so product list ETags must change along with the orders list
+    table_versions.bump("orders", "products", db=db)
+
     # Update order with final price and commit
     finalize_order(db_order, total_price, db)
 
+    order_cache.invalidate("orders_list")
+    invalidate_products(product_ids)
+
     # Return formatted response
     return format_order_response(db_order)
 
 
+def create_order_from_reservation(reservation_id: int, db: Session) -> schemas.Order:
+    """Turn a held reservation into an order, its stock was already checked and taken"""
+    items = consume_reservation(db, reservation_id)
+    products_map = get_products_by_ids(db, [item.product_id for item in items])
+
+    db_order = create_order_record(db)
+    total_price, _ = process_order_items(db_order.id, items, products_map, db, stock_reserved=True)
+    # The held quantities shown on product reads drop with the reservation
+    table_versions.bump("orders", "products", db=db)
+    finalize_order(db_order, total_price, db)
+
+    order_cache.invalidate("orders_list")
+    return format_order_response(db_order)
+
+
 def get_products_by_ids(db: Session, product_ids: list[int]) -> dict:
     """Fetch products by IDs and validate all exist"""
-    products_map = {
-        p.id: p for p in db.query(Product).filter(Product.id.in_(product_ids)).all()
-    }
+    products_map = fetch_products_by_ids(db, product_ids)
 
     # Check for missing products
     missing_ids = set(product_ids) - set(products_map.keys())
@@ -45,6 +89,13 @@ def get_products_by_ids(db: Session, product_ids: list[int]) -> dict:
     return products_map
 
 
+def fetch_products_by_ids(db: Session, product_ids: list[int]) -> dict:
+    """Fetch the existing products among product_ids in a single IN query"""
+    return {
+        p.id: p for p in db.query(Product).filter(Product.id.in_(product_ids)).all()
+    }
+
+
 def create_order_record(db: Session) -> Order:
     """Create initial order record"""
     db_order = Order(status="pending", total_price=0.0)
@@ -54,25 +105,31 @@ def create_order_record(db: Session) -> Order:
 
 
 def process_order_items(order_id: int, items: list[schemas.OrderProductItem],
-                        products_map: dict, db: Session) -> tuple[float, list]:
-    """Process each ordered item, validate stock, and create order products"""
+                        products_map: dict, db: Session, stock_reserved: bool = False) -> tuple[float, list]:
+    """
+    Process each ordered item, validate stock, and create order products.
+    stock_reserved skips the stock check and decrement for items held by a reservation.
+    """
     total_price = 0.0
     order_products_objects = []
 
+    if not stock_reserved:
+        decrement_stock(items, products_map, db)
+
     for item in items:
         product = products_map[item.product_id]
-        validate_product_stock(product, item.quantity)
 
-        # Calculate price and update stock
+        # Calculate price
         item_price = product.price * item.quantity
         total_price += item_price
-        product.stock -= item.quantity
 
-        # Create OrderProduct object
+        # Create OrderProduct object, snapshotting the price and name at order time
         order_product = OrderProduct(
             order_id=order_id,
             product_id=product.id,
-            quantity=item.quantity
+            quantity=item.quantity,
+            unit_price=product.price,
+            product_name=product.name
         )
         order_products_objects.append(order_product)
 
@@ -82,6 +139,33 @@ def process_order_items(order_id: int, items: list[schemas.OrderProductItem],
     return total_price, order_products_objects
 
 
+def decrement_stock(items: list[schemas.OrderProductItem], products_map: dict, db: Session) -> None:
+    """Validate and take stock for every item, all or nothing"""
+    # Validate every item before touching stock so a rejected order leaves no partial decrements
+    for item in items:
+        product = products_map[item.product_id]
+        if not product.stock_buckets:
+            validate_product_stock(product, item.quantity)
+
+    # Striped products are checked by their conditional bucket update, undo the
+    # buckets already taken if a later one runs out
+    taken = []
+    try:
+        for item in items:
+            product = products_map[item.product_id]
+            if product.stock_buckets:
+                taken.append((product.id, take_striped_stock(db, product, item.quantity)))
+    except exception.InsufficientStockError:
+        for product_id, buckets in taken:
+            restore_striped_stock(db, product_id, buckets)
+        raise
+
+    for item in items:
+        product = products_map[item.product_id]
+        if not product.stock_buckets:
+            product.stock -= item.quantity
+
+
 def validate_product_stock(product: Product, requested_quantity: int) -> None:
     """Validate product has sufficient stock"""
     if product.stock < requested_quantity:
@@ -99,8 +183,81 @@ def finalize_order(order: Order, total_price: float, db: Session) -> None:
     db.refresh(order)
 
 
-def format_order_response(order: Order) -> schemas.Order:
-    """Convert DB order to response schema"""
+def create_orders_batch(orders: list[schemas.OrderCreate], session_factory=SessionLocal) -> list:
+    """
+    Place a batch of orders in one transaction and one commit.
+    Returns a response or the exception to raise for each order, in order.
+    """
+    db = session_factory()
+    try:
+        product_ids = {item.product_id for order in orders for item in order.products}
+        # Lock the rows in id order so concurrent batches can't deadlock
+        products_map = {
+            p.id: p for p in db.query(Product).filter(Product.id.in_(product_ids))
+            .order_by(Product.id).with_for_update().all()
+        }
+
+        results = []
+        for order in orders:
+            # A savepoint per order, so a failing one is undone without touching the rest of the batch
+            savepoint = db.begin_nested()
+            try:
+                result = place_batched_order(order, products_map, db)
+                savepoint.commit()
+            except (exception.ProductNotFoundError, exception.InsufficientStockError, SQLAlchemyError) as exc:
+                savepoint.rollback()
+                if isinstance(exc, SQLAlchemyError):
+                    logger.exception("Batched order failed")
+                results.append(exc)
+            else:
+                results.append(result)
+
+        table_versions.bump("orders", "products", db=db)
+        db.commit()
+    finally:
+        db.close()
+
+    order_cache.invalidate("orders_list")
+    invalidate_products(product_ids)
+    return results
+
+
+def place_batched_order(order: schemas.OrderCreate, products_map: dict, db: Session) -> schemas.Order:
+    """Validate and write one order of a batch, stock checks see the earlier orders' decrements"""
+    for item in order.products:
+        if item.product_id not in products_map:
+            raise exception.ProductNotFoundError(item.product_id)
+        if not products_map[item.product_id].stock_buckets:
+            validate_product_stock(products_map[item.product_id], item.quantity)
+
+    db_order = create_order_record(db)
+    total_price, _ = process_order_items(db_order.id, order.products, products_map, db)
+    db_order.total_price = total_price
+
+    return schemas.Order(
+        id=db_order.id,
+        total_price=total_price,
+        status=db_order.status,
+        products=order.products
+    )
+
+
+order_batcher = GroupCommitter(
+    create_orders_batch, window=ORDER_BATCH_WINDOW_MS / 1000, max_size=ORDER_BATCH_MAX_SIZE,
+    timeout=ORDER_BATCH_TIMEOUT_SECONDS,
+) if ORDER_BATCHING_ENABLED else None
+
+
+def format_order_response(order: Order, expand: bool = False) -> schemas.Order:
+    """Convert DB order to response schema, with product names and prices when expanded"""
+    if expand:
+        return schemas.OrderExpanded(
+            id=order.id,
+            total_price=order.total_price,
+            status=order.status,
+            products=[format_order_line(op) for op in order.order_products]
+        )
+
     return schemas.Order(
         id=order.id,
         total_price=order.total_price,
@@ -115,54 +272,117 @@ def format_order_response(order: Order) -> schemas.Order:
     )
 
 
-def get_orders(db: Session = Depends(get_db)) -> List[schemas.Order]:
+def format_order_line(order_product: OrderProduct) -> schemas.OrderLine:
+    """Build an expanded line from the snapshot taken when the order was placed"""
+    unit_price = order_product.unit_price
+    product_name = order_product.product_name
+    if unit_price is None:
+        # Lines placed before snapshots existed fall back to the current product
+        unit_price = order_product.product.price
+        product_name = order_product.product.name
+
+    return schemas.OrderLine(
+        product_id=order_product.product_id,
+        quantity=order_product.quantity,
+        product_name=product_name,
+        unit_price=unit_price,
+        line_total=unit_price * order_product.quantity
+    )
+
+
+def format_archived_order(archived: OrderArchive, expand: bool = False) -> schemas.Order:
+    """Convert an archived order, whose lines are stored inline, to the response schema"""
+    if expand:
+        return schemas.OrderExpanded(
+            id=archived.id,
+            total_price=archived.total_price,
+            status=archived.status,
+            products=[
+                schemas.OrderLine(
+                    **line,
+                    line_total=line["unit_price"] * line["quantity"] if line["unit_price"] is not None else None
+                )
+                for line in archived.lines
+            ]
+        )
+
+    return schemas.Order(
+        id=archived.id,
+        total_price=archived.total_price,
+        status=archived.status,
+        products=[
+            schemas.OrderProductItem(product_id=line["product_id"], quantity=line["quantity"])
+            for line in archived.lines
+        ]
+    )
+
+
+def get_orders(request: Request, response: Response, expand: Optional[Literal["products"]] = None,
+               db: Session = Depends(get_db)) -> List[schemas.Order]:
     """
-    Get all orders with their products.
+    Get all orders with their products, `?expand=products` adds product names and prices.
+    Returns 304 without querying when the client's ETag is still current.
     """
+    not_modified = conditional_get(request, response, db, "orders", variant=expand)
+    if not_modified:
+        return not_modified
+
+    return list_orders(db, expand=expand is not None)
+
+
+def list_orders(db: Session, expand: bool = False) -> List[schemas.Order]:
+    """Load all orders, served from the cache when possible"""
     # Try to get from cache first
-    cache_key = "orders_list" # It can be user specific based on the need
+    cache_key = "orders_list_expanded" if expand else "orders_list"  # It can be user specific based on the need
     cached_orders = order_cache.get(cache_key)
 
     if cached_orders:
-        print("Returning from cache")
+        logger.debug("Returning orders from cache")
         return cached_orders
 
-    print("fetching from database")
-    # Fetch all orders with their order products in a single query
+    logger.debug("Fetching orders from database")
+    # Fetch all orders, then their order products in one IN query instead of a row per line item
     orders = db.query(Order).options(
-        joinedload(Order.order_products)
+        selectinload(Order.order_products)
     ).all()
 
     # Convert to response schema
-    result = [
-        format_order_response(order) for order in orders
-    ]
+    with tracer.span("serialize.orders", count=len(orders)):
+        result = [
+            format_order_response(order, expand) for order in orders
+        ]
 
     order_cache.set(cache_key, result)
 
     return result
 
 
-def get_order(order_id: int, db: Session = Depends(get_db)) -> schemas.Order:
+def get_order(order_id: int, expand: Optional[Literal["products"]] = None,
+              db: Session = Depends(get_db)) -> schemas.Order:
     """
-    Get a specific order by ID with its products.
+    Get a specific order by ID with its products, `?expand=products` adds product names and prices.
     """
-    cache_key = f"order_{order_id}"
+    cache_key = f"order_{order_id}_expanded" if expand else f"order_{order_id}"
     cached_order = order_cache.get(cache_key)
 
     if cached_order:
         # Invalidate the cache if and when order_id is updated to avoid returning stale data
         return cached_order
 
-    # Fetch the order with its order products in a single query
+    # Fetch the order, then its order products in a single IN query
     order = db.query(Order).options(
-        joinedload(Order.order_products)
+        selectinload(Order.order_products)
     ).filter(Order.id == order_id).first()
 
-    if not order:
-        raise exception.OrderNotFoundError(order_id)
+    if order:
+        # Convert to response schema
+        result = format_order_response(order, expand is not None)
+    else:
+        # Old closed orders live in the archive
+        archived = get_archived_order(db, order_id)
+        if not archived:
+            raise exception.OrderNotFoundError(order_id)
+        result = format_archived_order(archived, expand is not None)
 
-    # Convert to response schema
-    result = format_order_response(order)
     order_cache.set(cache_key, result)
     return result
@@ -1,4 +1,4 @@
-from fastapi import Depends
+from fastapi import Depends, Query, Request, Response
 from sqlalchemy.orm import Session
 from typing import List
 import logging
@@ -6,25 +6,99 @@ import logging
 from app import schemas, exception
 from app.settings.production import get_db
 from app.models import Product
+from app.cache import table_versions, product_cache
+from app.conditional import conditional_get
+from app.inventory import striped_stock_totals
+from app.reservations import held_stock
+from app.views.orders import fetch_products_by_ids
 
 logger = logging.getLogger(__name__)
 
 
-def get_products(db: Session = Depends(get_db)) -> List[schemas.Product]:
+def get_products(request: Request, response: Response, db: Session = Depends(get_db)) -> List[schemas.Product]:
     """
     Retrieve all products from the database.
+    Returns 304 without querying when the client's ETag is still current.
     """
-    return db.query(Product).all()
+    not_modified = conditional_get(request, response, db, "products")
+    if not_modified:
+        return not_modified
 
+    return with_striped_stock(db, db.query(Product).all())
 
-def get_product(product_id: int, db: Session = Depends(get_db)) -> schemas.Product:
+
+def get_product(product_id: int, db: Session = Depends(get_db)) -> schemas.ProductDetail:
     """
-    Retrieve a specific product by ID.
+    Retrieve a specific product by ID, with its available and reserved stock.
     """
     product = db.query(Product).filter(Product.id == product_id).first()
     if product is None:
         raise exception.ProductNotFoundError(product_id)
-    return product
+
+    product = schemas.Product.model_validate(with_striped_stock(db, [product])[0])
+    return schemas.ProductDetail(
+        **product.model_dump(),
+        available=product.stock,
+        held=held_stock(db, [product_id]).get(product_id, 0)
+    )
+
+
+def get_products_batch(
+    ids: str = Query(pattern=r"^\d+(,\d+)*$", max_length=2000, description="Comma separated product ids"),
+    db: Session = Depends(get_db)
+) -> schemas.ProductBatch:
+    """
+    Retrieve several products by ID in one request, e.g. `?ids=1,2,3`.
+    """
+    return lookup_products(db, [int(product_id) for product_id in ids.split(",")])
+
+
+def post_products_batch(batch: schemas.ProductBatchRequest, db: Session = Depends(get_db)) -> schemas.ProductBatch:
+    """
+    Retrieve several products by ID, for lists too long for a query string.
+    """
+    return lookup_products(db, batch.ids)
+
+
+def lookup_products(db: Session, product_ids: List[int]) -> schemas.ProductBatch:
+    """Serve products from the cache, load all misses in one query and keep the requested order"""
+    product_ids = list(dict.fromkeys(product_ids))
+    found = {}
+    misses = []
+    for product_id in product_ids:
+        cached = product_cache.get(f"product_{product_id}")
+        if cached is None:
+            misses.append(product_id)
+        else:
+            found[product_id] = cached
+
+    if misses:
+        fetched = fetch_products_by_ids(db, misses)
+        for product in with_striped_stock(db, list(fetched.values())):
+            product = schemas.Product.model_validate(product)
+            found[product.id] = product
+            # Striped stock changes without invalidation, it has its own short lived aggregate cache
+            if not fetched[product.id].stock_buckets:
+                product_cache.set(f"product_{product.id}", product)
+
+    return schemas.ProductBatch(
+        products=[found[product_id] for product_id in product_ids if product_id in found],
+        missing=[product_id for product_id in product_ids if product_id not in found]
+    )
+
+
+def with_striped_stock(db: Session, products: List[Product]) -> list:
+    """Report striped products with the summed stock of their buckets"""
+    striped_ids = [p.id for p in products if p.stock_buckets]
+    if not striped_ids:
+        return products
+
+    totals = striped_stock_totals(db, striped_ids)
+    return [
+        schemas.Product.model_validate(p).model_copy(update={"stock": totals.get(p.id, 0)})
+        if p.stock_buckets else p
+        for p in products
+    ]
 
 
 def create_product(product: schemas.ProductCreate, db: Session = Depends(get_db)) -> schemas.Product:
@@ -33,6 +107,7 @@ def create_product(product: schemas.ProductCreate, db: Session = Depends(get_db)
     """
     db_product = Product(**product.model_dump())
     db.add(db_product)
+    table_versions.bump("products", db=db)
     db.commit()
     db.refresh(db_product)
     return db_product
@@ -0,0 +1,39 @@
+from fastapi import Depends
+from sqlalchemy.orm import Session
+
+from app import schemas
+from app.settings.production import get_db
+from app.models import Reservation, ReservationItem
+from app.cache import table_versions, invalidate_products
+from app.reservations import expiry_after
+from app.views.orders import get_products_by_ids, decrement_stock
+
+
+def create_reservation(reservation: schemas.ReservationCreate, db: Session = Depends(get_db)) -> schemas.Reservation:
+    """
+    Hold stock for a cart until the reservation expires.
+    An order placed with the reservation_id uses the held stock without checking it again.
+    """
+    product_ids = [item.product_id for item in reservation.products]
+    products_map = get_products_by_ids(db, product_ids)
+
+    # Same all-or-nothing stock check and decrement as an order
+    decrement_stock(reservation.products, products_map, db)
+
+    db_reservation = Reservation(
+        expires_at=expiry_after(reservation.ttl_seconds),
+        items=[
+            ReservationItem(product_id=item.product_id, quantity=item.quantity)
+            for item in reservation.products
+        ]
+    )
+    db.add(db_reservation)
+    table_versions.bump("products", db=db)
+    db.commit()
+    invalidate_products(product_ids)
+
+    return schemas.Reservation(
+        id=db_reservation.id,
+        products=reservation.products,
+        expires_at=db_reservation.expires_at
+    )
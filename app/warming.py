@@ -0,0 +1,143 @@
+"""
+Cache warming from access frequencies: the hottest keys of the bounded caches
+are snapshotted to CACHE_HOT_KEYS_PATH periodically and prefetched in
+batches on the next startup, before /ready reports the worker ready.
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.orm import selectinload
+
+from app.cache import order_cache, product_cache
+from app.models import Order
+from app.settings.production import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Warming is off unless a snapshot path is set, e.g. a volume that survives deploys
+CACHE_HOT_KEYS_PATH = os.getenv("CACHE_HOT_KEYS_PATH", "")
+CACHE_HOT_KEYS_TOP_K = int(os.getenv("CACHE_HOT_KEYS_TOP_K", "1000"))
+CACHE_SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("CACHE_SNAPSHOT_INTERVAL_SECONDS", "60"))
+WARMUP_BATCH_SIZE = int(os.getenv("STARTUP_WARMUP_BATCH_SIZE", "100"))
+WARMUP_CONCURRENCY = int(os.getenv("STARTUP_WARMUP_CONCURRENCY", "4"))
+
+WARMED_CACHES = {
+    "order_cache": order_cache,
+    "product_cache": product_cache,
+}
+
+
+def load_orders(db, matches) -> None:
+    from app.views.orders import format_order_response
+
+    order_ids = {int(match.group(1)) for match in matches}
+    orders = db.query(Order).options(selectinload(Order.order_products)).filter(Order.id.in_(order_ids)).all()
+    expanded = {int(match.group(1)) for match in matches if match.group(2)}
+    for order in orders:
+        order_cache.set(f"order_{order.id}", format_order_response(order))
+        if order.id in expanded:
+            order_cache.set(f"order_{order.id}_expanded", format_order_response(order, expand=True))
+
+
+def load_order_lists(db, matches) -> None:
+    from app.views.orders import list_orders
+
+    for expand in {bool(match.group(1)) for match in matches}:
+        list_orders(db, expand=expand)
+
+
+def load_products(db, matches) -> None:
+    from app.views.products import lookup_products
+
+    lookup_products(db, [int(match.group(1)) for match in matches])
+
+
+# (cache name, key pattern, loader) - a loader gets the regex matches of one batch of keys
+KEY_LOADERS = [
+    ("order_cache", re.compile(r"order_(\d+)(_expanded)?$"), load_orders),
+    ("order_cache", re.compile(r"orders_list(_expanded)?$"), load_order_lists),
+    ("product_cache", re.compile(r"product_(\d+)$"), load_products),
+]
+
+
+def snapshot_hot_keys(path: str = CACHE_HOT_KEYS_PATH, top_k: int = CACHE_HOT_KEYS_TOP_K,
+                      caches: dict = WARMED_CACHES) -> None:
+    """Write the top_k hottest keys of every warmed cache, replacing the file atomically"""
+    snapshot = {
+        "written_at": time.time(),
+        "caches": {name: cache.hot_keys(top_k) for name, cache in caches.items()},
+    }
+    # A temp file of our own, so workers snapshotting at the same time never write into each other's file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as out:
+            json.dump(snapshot, out)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_hot_keys(path: str = CACHE_HOT_KEYS_PATH) -> dict:
+    try:
+        with open(path, encoding="utf-8") as snapshot:
+            return json.load(snapshot).get("caches", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def plan_batches(hot_keys: dict, batch_size: int = WARMUP_BATCH_SIZE) -> list:
+    """Group the keys by loader, hottest first, and split them into (loader, matches) batches"""
+    grouped = {}
+    for cache_name, keys in hot_keys.items():
+        for key in keys:
+            for loader_cache, pattern, loader in KEY_LOADERS:
+                match = pattern.match(key) if loader_cache == cache_name else None
+                if match:
+                    grouped.setdefault(loader, []).append(match)
+                    break
+
+    return [
+        (loader, matches[i:i + batch_size])
+        for loader, matches in grouped.items()
+        for i in range(0, len(matches), batch_size)
+    ]
+
+
+def warm_hot_keys(path: str = CACHE_HOT_KEYS_PATH, session_factory=SessionLocal,
+                  concurrency: int = WARMUP_CONCURRENCY, batch_size: int = WARMUP_BATCH_SIZE) -> int:
+    """Prefetch the keys of the last snapshot, at most `concurrency` batches at a time"""
+    if not path:
+        return 0
+    batches = plan_batches(load_hot_keys(path), batch_size)
+
+    def run_batch(batch):
+        loader, matches = batch
+        db = session_factory()
+        try:
+            loader(db, matches)
+            return len(matches)
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+        warmed = sum(executor.map(run_batch, batches))
+    logger.info(f"Prefetched {warmed} hot cache keys")
+    return warmed
+
+
+async def run_snapshotter(path: str = CACHE_HOT_KEYS_PATH,
+                          interval: float = CACHE_SNAPSHOT_INTERVAL_SECONDS) -> None:
+    """Background task snapshotting the hot keys every interval seconds"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(snapshot_hot_keys, path)
+        except Exception:
+            logger.exception("Hot key snapshot failed")
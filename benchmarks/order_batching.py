@@ -0,0 +1,107 @@
+"""
+Orders/sec and latency of create_order committing per request vs group commit.
+
+    python -m benchmarks.order_batching --threads 32 --orders 2000
+
+Uses a throwaway SQLite file unless BENCH_DATABASE_URL points at a (scratch!)
+Postgres database, which is where commit latency and fsync really dominate.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import schemas
+from app.batching import GroupCommitter
+from app.models import Product
+from app.settings.production import Base
+from app.views.orders import create_order, create_orders_batch
+
+PRODUCTS = 50
+
+
+def setup_database(url):
+    engine = create_engine(
+        url, pool_size=64, max_overflow=0,
+        connect_args={"check_same_thread": False, "timeout": 30} if url.startswith("sqlite") else {}
+    )
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with factory() as db:
+        db.add_all([
+            Product(name=f"Product {i}", description="", price=1.0, stock=10_000_000) for i in range(PRODUCTS)
+        ])
+        db.commit()
+    return factory
+
+
+def make_order(i):
+    return schemas.OrderCreate(products=[
+        schemas.OrderProductItem(product_id=i % PRODUCTS + 1, quantity=1),
+        schemas.OrderProductItem(product_id=(i + 7) % PRODUCTS + 1, quantity=2),
+    ])
+
+
+def run(place, orders, threads):
+    latencies = []
+    errors = 0
+
+    def timed(i):
+        start = time.perf_counter()
+        place(make_order(i))
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = [executor.submit(timed, i) for i in range(orders)]
+        for future in futures:
+            try:
+                latencies.append(future.result())
+            except Exception:
+                errors += 1
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "orders/sec": round(len(latencies) / elapsed),
+        "p50 ms": round(statistics.median(latencies) * 1000, 2),
+        "p99 ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--window-ms", type=float, default=2)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    url = os.getenv("BENCH_DATABASE_URL") or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+
+    factory = setup_database(url)
+
+    def per_request(order):
+        with factory() as db:
+            return create_order(order, db)
+
+    print("per-request commit:", run(per_request, args.orders, args.threads))
+
+    factory = setup_database(url)
+    committer = GroupCommitter(
+        partial(create_orders_batch, session_factory=factory),
+        window=args.window_ms / 1000, max_size=args.batch_size
+    )
+    print("group commit:      ", run(committer.submit, args.orders, args.threads))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Cost of the rate limiting and admission checks per request.
+
+    python -m benchmarks.ratelimit --keys 100000 --iterations 20000
+
+Measures a take() on known keys together with the admission check, and a take()
+for new keys once the backend is at max_keys, the path that evicts buckets.
+"""
+import argparse
+import time
+
+from app.ratelimit import InMemoryBackend, RateLimitMiddleware
+
+
+def per_call_us(fn, iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(i)
+    return (time.perf_counter() - start) / iterations * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--keys", type=int, default=100_000)
+    parser.add_argument("--iterations", type=int, default=20_000)
+    args = parser.parse_args()
+
+    backend = InMemoryBackend(rate=1_000_000, burst=1_000_000)
+    middleware = RateLimitMiddleware(None, backend=backend, max_in_flight=100, list_route_concurrency=10)
+
+    def check(i):
+        backend.take(i % 1000)
+        for limiter in middleware.admit(("GET", "/orders/")):
+            limiter.release()
+
+    print(f"known key + admission:     {per_call_us(check, args.iterations):6.2f} us")
+
+    full = InMemoryBackend(rate=0.001, burst=1, max_keys=args.keys)
+    for i in range(args.keys):
+        full.take(i)
+    print(f"new key past max_keys:     {per_call_us(lambda i: full.take(f'new-{i}'), args.iterations):6.2f} us")
+
+
+if __name__ == "__main__":
+    main()
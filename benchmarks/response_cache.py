@@ -0,0 +1,116 @@
+"""
+Requests/sec on cached GET routes with and without the response cache.
+
+    python -m benchmarks.response_cache --requests 5000 --concurrency 32 [--write-every 20]
+
+Requests go straight to the ASGI app in process, so the numbers measure the
+framework, session and serialization work the cache skips, not the network.
+With --write-every N, every Nth request places an order instead, so the hit
+rate under checkout load shows too.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import schemas
+from app.cache import order_cache, product_cache
+from app.models import Product
+from app.response_cache import ResponseCacheMiddleware
+from app.settings.production import Base, get_db
+from app.urls import router
+from app.views.orders import create_order
+
+PRODUCTS = 50
+ORDERS = 200
+ROUTES = ("/orders/{id}", "/orders/{id}?expand=products", "/products/{id}")
+
+
+def setup_database(url):
+    engine = create_engine(url, connect_args={"check_same_thread": False} if url.startswith("sqlite") else {})
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with factory() as db:
+        db.add_all([
+            Product(name=f"Product {i}", description="", price=1.0, stock=1_000_000) for i in range(PRODUCTS)
+        ])
+        db.commit()
+        for i in range(ORDERS):
+            create_order(schemas.OrderCreate(products=[
+                schemas.OrderProductItem(product_id=i % PRODUCTS + 1, quantity=1)
+            ]), db)
+    return factory
+
+
+def make_app(factory):
+    api = FastAPI()
+    api.include_router(router)
+
+    def override_get_db():
+        db = factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    api.dependency_overrides[get_db] = override_get_db
+    return api
+
+
+async def run(asgi_app, route, requests, concurrency, write_every=0):
+    transport = httpx.ASGITransport(app=asgi_app)
+    paths = [route.format(id=i % PRODUCTS + 1) for i in range(requests)]
+    queue = asyncio.Queue()
+    for i, path in enumerate(paths):
+        queue.put_nowait((i, path))
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            while not queue.empty():
+                i, path = queue.get_nowait()
+                if write_every and i % write_every == 0:
+                    response = await client.post("/orders/", json={"products": [
+                        {"product_id": i * 7 % PRODUCTS + 1, "quantity": 1}
+                    ]})
+                    assert response.status_code == 201, response.text
+                    continue
+                response = await client.get(path)
+                assert response.status_code == 200, response.text
+
+        # Warm both caches first so only steady state hits are timed
+        await asyncio.gather(*(client.get(path) for path in set(paths)))
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return round(requests / elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--write-every", type=int, default=0, help="place an order every N requests")
+    args = parser.parse_args()
+
+    url = os.getenv("BENCH_DATABASE_URL") or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    api = make_app(setup_database(url))
+
+    for route in ROUTES:
+        order_cache.invalidate()
+        product_cache.invalidate()
+        before = asyncio.run(run(api, route, args.requests, args.concurrency, args.write_every))
+        after = asyncio.run(run(ResponseCacheMiddleware(api), route, args.requests, args.concurrency,
+                                args.write_every))
+        print(f"{route:32} without cache: {before:6} req/s   with cache: {after:6} req/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Checkout throughput on one hot product as the number of stock buckets grows.
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.striped_stock --threads 32
+
+Each K is measured twice: transactions that only take one unit of the
+product's stock and commit, and full checkouts through create_order, which
+also load the product, write the order and bump the table versions. The gap
+between the two is the cost of everything around the striped stock. Row lock
+contention only shows on Postgres; SQLite locks the whole database, so the
+default throwaway SQLite run only checks that the code paths work.
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import schemas
+from app.inventory import enable_striping, take_striped_stock
+from app.models import Product
+from app.settings.production import Base
+from app.views.orders import create_order
+
+
+def setup_database(url, buckets):
+    engine = create_engine(
+        url, pool_size=64, max_overflow=0,
+        connect_args={"check_same_thread": False, "timeout": 30} if url.startswith("sqlite") else {}
+    )
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with factory() as db:
+        product = Product(name="Hot item", description="", price=1.0, stock=10_000_000)
+        db.add(product)
+        db.commit()
+        enable_striping(db, product.id, buckets)
+        return factory, product.id
+
+
+def take_stock(factory, product_id):
+    with factory() as db:
+        product = db.get(Product, product_id)
+        take_striped_stock(db, product, 1)
+        db.commit()
+
+
+def checkout(factory, product_id):
+    with factory() as db:
+        create_order(schemas.OrderCreate(products=[
+            schemas.OrderProductItem(product_id=product_id, quantity=1)
+        ]), db)
+
+
+def run(transaction, factory, product_id, transactions, threads):
+    def work(_):
+        transaction(factory, product_id)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(work, range(transactions)))
+    return transactions / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--transactions", type=int, default=2000)
+    parser.add_argument("--buckets", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    url = os.getenv("BENCH_DATABASE_URL") or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    for buckets in args.buckets:
+        rates = []
+        for transaction in (take_stock, checkout):
+            factory, product_id = setup_database(url, buckets)
+            rates.append(run(transaction, factory, product_id, args.transactions, args.threads))
+        print(f"K={buckets:<3} stock only: {rates[0]:8.0f} tx/sec   create_order: {rates[1]:8.0f} checkouts/sec")
+
+
+if __name__ == "__main__":
+    main()